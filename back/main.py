@@ -10,14 +10,20 @@ import pathlib
 import logging
 import traceback
 import json
+import hashlib
+import hmac
+import io
+import threading
+import time
 from pathlib import Path
 import pandas as pd
 import joblib
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from pydantic import BaseModel, Field
@@ -115,7 +121,9 @@ except Exception as e:
 _MATCHER_AVAILABLE = True
 try:
     # Ensure matcher package is importable: project_root/matcher/...
-    from matcher.service import run_match_and_insert
+    from matcher.service import run_match_and_insert, iter_match_and_insert
+    from matcher.jobs import get_job_queue
+    from matcher.vectorstore import warm_vectordb, close_vectordb
     log.info("Matcher service imported.")
 except Exception as e:
     _MATCHER_AVAILABLE = False
@@ -128,9 +136,33 @@ MODEL_PATH = os.getenv("MODEL_PATH", "back/models/readiness_model.joblib")
 BASELINE_PATH = os.getenv("BASELINE_PATH", "back/models/group_baseline.csv")
 COHORT_PATH = os.getenv("COHORT_PATH", "back/models/cohort_index.parquet.gz")
 
-model = None
-baseline_df = None
-cohort_df = None
+ARTIFACT_WATCH_SECONDS = float(os.getenv("ARTIFACT_WATCH_SECONDS", "30"))  # poll the files for changes; 0 = off
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")                                  # X-Admin-Token for /admin/*; empty = disabled
+
+
+class ReadinessArtifacts:
+    """
+    One loaded version of the readiness artifacts and everything derived from them.
+    Built off to the side (_read_artifacts, _build_lookups, _build_prediction_grid)
+    and published by rebinding `artifacts`; a request reads `artifacts` once and
+    keeps using that version until it finishes, even if a reload lands meanwhile.
+    """
+    def __init__(self, model=None, baseline_df=None, cohort_df=None, version=None, sources=None, errors=None):
+        self.model = model
+        self.baseline_df = baseline_df
+        self.cohort_df = cohort_df
+        self.version = version
+        self.sources = sources or {}     # path -> (mtime_ns, size) of the files that were read
+        self.errors = errors or {}       # component ("model" | "baseline" | "cohort") -> load error
+        self.loaded_at = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+        # hashed lookups (see the /predict section) and the precomputed /options grid
+        self.prior_tables = None
+        self.cohort_table = None
+        self.grid = None
+
+artifacts = ReadinessArtifacts()
+_reload_lock = threading.Lock()
+last_reload: Dict[str, Any] = {}
 meta = {
     "mode": "cohort",
     "latest_year_seen": "2025",
@@ -184,7 +216,8 @@ def _extract_model(obj):
             return obj["pipeline"]
     return obj
 
-def _positive_proba_from_estimator(est, X):
+def _positive_probas_from_estimator(est, X):
+    """Positive-class column of predict_proba for every row of X (None if the output is not 2-D)."""
     import numpy as np
     proba = est.predict_proba(X)
     arr = np.asarray(proba)
@@ -201,24 +234,59 @@ def _positive_proba_from_estimator(est, X):
                     break
     except Exception:
         pass
-    return float(arr[0, idx])
+    return arr[:, idx]
 
+def _positive_proba_from_estimator(est, X):
+    col = _positive_probas_from_estimator(est, X)
+    return None if col is None else float(col[0])
+
+
+def _artifact_stats() -> Dict[str, Optional[Tuple[int, int]]]:
+    out: Dict[str, Optional[Tuple[int, int]]] = {}
+    for path in (MODEL_PATH, BASELINE_PATH, COHORT_PATH):
+        try:
+            st = os.stat(path)
+            out[path] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            out[path] = None
+    return out
+
+def _read_artifacts() -> ReadinessArtifacts:
+    """
+    Read the three artifact files into a new, unpublished bundle. Each file is read once;
+    the same bytes are parsed and hashed, so the version always matches what was loaded.
+    A file that fails to load is logged and recorded in `errors` by component.
+    """
+    model = baseline_df = cohort_df = None
+    errors: Dict[str, str] = {}
+    h = hashlib.sha256()
+    sources = _artifact_stats()
+
+    def _bytes(path: str) -> Optional[bytes]:
+        h.update(path.encode("utf-8"))
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+        h.update(data)
+        return data
 
-def _load_artifacts():
-    global model, baseline_df, cohort_df
     try:
-        if os.path.exists(MODEL_PATH):
-            raw_model = joblib.load(MODEL_PATH)
+        data = _bytes(MODEL_PATH)
+        if data is not None:
+            raw_model = joblib.load(io.BytesIO(data))
             model = _extract_model(raw_model)
             log.info(f"✅ model loaded from {MODEL_PATH}: {type(raw_model)} -> using {type(model)}")
         else:
             log.warning(f"⚠️ MODEL not found at {MODEL_PATH}")
     except Exception as e:
         log.error(f"❌ Failed to load model: {e}")
+        errors["model"] = str(e)
 
     try:
-        if os.path.exists(BASELINE_PATH):
-            df = pd.read_csv(BASELINE_PATH)
+        data = _bytes(BASELINE_PATH)
+        if data is not None:
+            df = pd.read_csv(io.BytesIO(data))
             rename_map = {"sector": "القطاع_العام", "region": "المنطقة", "size": "الحجم"}
             df = df.rename(columns={k: v for k, v in rename_map.items() if k in df.columns})
 
@@ -236,10 +304,12 @@ def _load_artifacts():
             log.warning(f"⚠️ BASELINE not found at {BASELINE_PATH}")
     except Exception as e:
         log.error(f"❌ Failed to load baseline: {e}")
+        errors["baseline"] = str(e)
 
     try:
-        if os.path.exists(COHORT_PATH):
-            df = pd.read_parquet(COHORT_PATH)
+        data = _bytes(COHORT_PATH)
+        if data is not None:
+            df = pd.read_parquet(io.BytesIO(data))
             df = _normalize_cat(df, ["القطاع_العام","المنطقة","الحجم"])
             cohort_df = df
             log.info(f"✅ cohort loaded: rows={len(cohort_df)}; cols={list(cohort_df.columns)}")
@@ -247,6 +317,106 @@ def _load_artifacts():
             log.warning(f"⚠️ COHORT not found at {COHORT_PATH}")
     except Exception as e:
         log.error(f"❌ Failed to load cohort: {e}")
+        errors["cohort"] = str(e)
+
+    # the calibration settings are baked into the precomputed grid, so they are part of the version
+    for var, default in (("PRIOR_DEFAULT", "0.4"), ("CALIB_ALPHA", "25"),
+                         ("CALIB_CLIP_LO", "0.05"), ("CALIB_CLIP_HI", "0.95")):
+        h.update(f"{var}={os.getenv(var, default)}".encode("utf-8"))
+    return ReadinessArtifacts(model, baseline_df, cohort_df, h.hexdigest()[:16], sources, errors)
+
+def _derive_artifacts(arts: ReadinessArtifacts) -> None:
+    try:
+        _build_lookups(arts)
+    except Exception as e:
+        log.error(f"❌ Failed to build predict lookups (falling back to scans): {e}")
+
+    try:
+        _build_prediction_grid(arts)
+    except Exception as e:
+        log.error(f"❌ Failed to precompute the prediction grid (computing per request): {e}")
+
+def _load_artifacts():
+    """Startup load: whatever could be read is published, as before."""
+    global artifacts
+    arts = _read_artifacts()
+    _derive_artifacts(arts)
+    artifacts = arts
+    log.info(f"✅ readiness artifacts version {arts.version} active")
+
+def _validate_artifacts(arts: ReadinessArtifacts, current: ReadinessArtifacts) -> List[str]:
+    """
+    Reasons not to publish `arts` in place of `current` (empty = fine). A load error the
+    active version already has (e.g. a model pickle this sklearn cannot read) is not a
+    regression, so it does not block new baseline / cohort data.
+    """
+    problems = [f"{name}: {err}" for name, err in arts.errors.items() if name not in current.errors]
+    for name in ("model", "baseline_df", "cohort_df"):
+        if getattr(current, name) is not None and getattr(arts, name) is None:
+            problems.append(f"{name} is missing but the active version has one")
+    for name in ("baseline_df", "cohort_df"):
+        df = getattr(arts, name)
+        if df is not None:
+            missing = [c for c in CAT_COLS if c not in df.columns]
+            if df.empty or missing:
+                problems.append(f"{name} is empty or lacks columns {missing}")
+    if arts.model is not None:
+        opts = get_options()
+        p = _model_probs_for([(opts["sector"][0], opts["region"][0], opts["size"][0], PREDICT_YEAR)], arts)[0]
+        if p is None or not 0.0 <= p <= 1.0:
+            problems.append(f"model smoke prediction failed (got {p!r})")
+    return problems
+
+def reload_artifacts(force: bool = False, reason: str = "manual") -> Dict[str, Any]:
+    """
+    Load the artifact files as a new version in the calling thread, validate it, build its
+    lookups and grid, then swap it in with one assignment. Requests keep being served by
+    the active version throughout, and keep it if the new one is rejected.
+    """
+    global artifacts, last_reload
+    with _reload_lock:
+        t0 = time.perf_counter()
+        current = artifacts
+        arts = _read_artifacts()
+        status: Dict[str, Any] = {"reason": reason, "at": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+                                  "previous_version": current.version, "version": arts.version}
+        if arts.version == current.version and not force:
+            status.update(ok=True, swapped=False, detail="unchanged")
+        else:
+            problems = _validate_artifacts(arts, current)
+            if not problems:
+                _derive_artifacts(arts)
+                if arts.grid is None and current.grid is not None:
+                    problems.append("prediction grid could not be built")
+            if problems:
+                status.update(ok=False, swapped=False, problems=problems)
+                log.error(f"❌ artifact reload ({reason}) rejected, keeping {current.version}: {problems}")
+            else:
+                artifacts = arts
+                status.update(ok=True, swapped=True)
+                log.info(f"✅ artifacts reloaded ({reason}): {current.version} -> {arts.version}")
+        status["seconds"] = round(time.perf_counter() - t0, 3)
+        last_reload = status
+        return status
+
+_watch_stop = threading.Event()
+
+def _watch_artifacts() -> None:
+    """Poll the artifact files; reload once a change has held still for one interval (no half-written files)."""
+    pending = settled = None
+    while not _watch_stop.wait(ARTIFACT_WATCH_SECONDS):
+        stats = _artifact_stats()
+        if stats == artifacts.sources or stats == settled:
+            pending = None
+            continue
+        if stats != pending:
+            pending = stats
+            continue
+        try:
+            reload_artifacts(reason="file change")
+        except Exception as e:
+            log.error(f"❌ artifact reload (file change) failed: {e}")
+        pending, settled = None, stats
 
 
     
@@ -445,10 +615,10 @@ async def create_project(p: ProjectIn, current_user: int = Depends(get_current_u
 
         created = res.data[0]
 
-        matching = {"inserted": 0, "run_at": None, "error": None}
+        matching = {"job_id": None, "status": None, "inserted": 0, "run_at": None, "error": None}
         if _MATCHER_AVAILABLE:
             try:
-                matching = run_match_and_insert(
+                job = get_job_queue().enqueue(
                     {
                         "id": created["id"],
                         "slug": created.get("slug"),
@@ -462,7 +632,8 @@ async def create_project(p: ProjectIn, current_user: int = Depends(get_current_u
                     top_k=int(os.getenv("MATCH_TOP_K", "5")),
                     calibration=os.getenv("MATCH_CALIBRATION", "relative_minmax"),
                 )
-                log.info("MATCH → inserted=%s run_at=%s", matching.get("inserted"), matching.get("run_at"))
+                matching.update({"job_id": job["job_id"], "status": job["status"]})
+                log.info("MATCH → queued job=%s project=%s", job["job_id"], created["id"])
             except Exception as e:
                 matching["error"] = str(e)
                 log.warning("MATCH ERROR → %s", _exc_str(e))
@@ -663,14 +834,153 @@ async def project_matches(
         log.error("project_matches error:\n%s", _exc_str(e))
         raise HTTPException(status_code=500, detail="Failed to get matches")
 
+@app.get("/projects/{project_id}/match-jobs/{job_id}")
+async def project_match_job(project_id: str, job_id: str, current_user: int = Depends(get_current_user)):
+    try:
+        own = (
+            supabase.table("projects")
+            .select("id, user_id")
+            .eq("id", project_id)
+            .limit(1)
+            .execute()
+        )
+        if not own.data:
+            raise HTTPException(status_code=404, detail="Project not found")
+        if own.data[0]["user_id"] != current_user:
+            raise HTTPException(status_code=403, detail="Forbidden")
+        if not _MATCHER_AVAILABLE:
+            raise HTTPException(status_code=503, detail="matcher_not_available")
+
+        job = get_job_queue().get(job_id)
+        if not job or str(job["project_id"]) != str(project_id):
+            raise HTTPException(status_code=404, detail="Job not found")
+        return {"job": job}
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.error("project_match_job error:\n%s", _exc_str(e))
+        raise HTTPException(status_code=500, detail="Failed to get match job")
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+STREAM_TOKEN_EXPIRE_SECONDS = 60
+_optional_bearer = OAuth2PasswordBearer(tokenUrl="login", auto_error=False)
+
+@app.post("/projects/{project_id}/match/stream-token")
+async def project_match_stream_token(project_id: str, current_user: int = Depends(get_current_user)):
+    """
+    Short-lived token for the match stream: browser EventSource cannot send an
+    Authorization header, so it passes this as ?token= instead.
+    """
+    token = create_access_token(
+        {"sub": str(current_user), "scope": "match_stream", "project_id": str(project_id)},
+        timedelta(seconds=STREAM_TOKEN_EXPIRE_SECONDS),
+    )
+    return {"token": token, "expires_in": STREAM_TOKEN_EXPIRE_SECONDS}
+
+def _stream_user(project_id: str, bearer: Optional[str], token: Optional[str]) -> int:
+    """Bearer header (fetch clients) or a stream token for this project (EventSource)."""
+    if bearer:
+        return get_current_user(bearer)
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    if payload.get("scope") != "match_stream" or payload.get("project_id") != str(project_id) \
+            or payload.get("sub") is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return int(payload["sub"])
+
+@app.get("/projects/{project_id}/match/stream")
+async def project_match_stream(project_id: str,
+                               token: Optional[str] = Query(None),
+                               bearer: Optional[str] = Depends(_optional_bearer)):
+    """
+    Run the matcher for an existing project and stream progress as Server-Sent Events:
+    retrieval -> candidate (per scored program) -> ranking -> persisted  (or error).
+
+    Auth: an Authorization: Bearer header, or ?token= from POST .../match/stream-token
+    (EventSource cannot set headers). Scoring is always per-candidate LLM ("llm" mode,
+    no early stop) whatever SCORING_MODE says, so each candidate can be streamed as it
+    is scored; the retrieval and ranking events carry meta.scoring saying so.
+    """
+    current_user = _stream_user(project_id, bearer, token)
+    try:
+        res = (
+            supabase.table("projects")
+            .select("*")
+            .eq("id", project_id)
+            .limit(1)
+            .execute()
+        )
+        if not res.data:
+            raise HTTPException(status_code=404, detail="Project not found")
+        proj = res.data[0]
+        if proj["user_id"] != current_user:
+            raise HTTPException(status_code=403, detail="Forbidden")
+        if not _MATCHER_AVAILABLE:
+            raise HTTPException(status_code=503, detail="matcher_not_available")
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.error("project_match_stream error:\n%s", _exc_str(e))
+        raise HTTPException(status_code=500, detail="Failed to start matching")
+
+    project_row = {
+        "id": proj["id"],
+        "slug": proj.get("slug"),
+        "name": proj["name"],
+        "description": proj["description"],
+        "sectors": proj.get("sectors") or [],
+        "stage": proj["stage"],
+        "funding_need": proj.get("funding_need") or 0.0,
+        "goals": proj.get("goals") or [],
+    }
+
+    # sync generator: Starlette iterates it in a worker thread, so LLM calls don't block the loop
+    def events():
+        try:
+            for event, data in iter_match_and_insert(
+                project_row,
+                top_k=int(os.getenv("MATCH_TOP_K", "5")),
+                calibration=os.getenv("MATCH_CALIBRATION", "relative_minmax"),
+            ):
+                yield _sse(event, data)
+        except Exception as e:
+            log.warning("MATCH STREAM ERROR → %s", _exc_str(e))
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # --------------------------------------------------------------------------------------
 # App startup/shutdown hooks (extra diagnostics)
 # --------------------------------------------------------------------------------------
 @app.on_event("startup")
 async def _on_startup():
+    if _MATCHER_AVAILABLE:
+        # own block: a failure below must not leave POST /projects queuing match jobs nobody runs
+        # (enqueue also starts the pool on first use)
+        try:
+            get_job_queue().start()
+        except Exception as e:
+            log.error("Match job queue failed to start:\n%s", _exc_str(e))
     try:
         log.info("Starting the application...")
         _load_artifacts()
+        if ARTIFACT_WATCH_SECONDS > 0:
+            threading.Thread(target=_watch_artifacts, name="artifact-watch", daemon=True).start()
+        if _MATCHER_AVAILABLE:
+            try:
+                log.info("Vector store warmed: %s program docs.", warm_vectordb())
+            except Exception as e:
+                log.warning("Vector store warm-up failed; will open lazily.\n%s", _exc_str(e))
         # (Optional) ping a trivial table if you want to verify DB connectivity here
         # supabase.table("health_check").select("id").limit(1).execute()
     except Exception as e:
@@ -680,6 +990,12 @@ async def _on_startup():
 async def _on_shutdown():
     try:
         log.info("Shutting down application.")
+        _watch_stop.set()
+        if model_batcher is not None:
+            model_batcher.stop()
+        if _MATCHER_AVAILABLE:
+            get_job_queue().shutdown(wait=False)
+            close_vectordb()
     except Exception as e:
         log.error(f"retrieve_context failed: {e}")
         return ""
@@ -972,7 +1288,9 @@ def _compat_test(payload: RagTestIn):
 # --------------------------------------------------------------------------------------
 # Readiness model – no 50% default, hierarchical prior, hardcoded options
 # --------------------------------------------------------------------------------------
-from fastapi import Body, HTTPException
+from fastapi import Body, Header, HTTPException, Response
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 import os
 import numpy as np
 import pandas as pd
@@ -1039,7 +1357,8 @@ def get_options():
     }
 
 # ---------- Priors from baseline (hierarchical) ----------
-def _baseline_prior(sector: str, region: str, size: str) -> Optional[float]:
+def _baseline_prior_scan(sector: str, region: str, size: str,
+                         arts: Optional[ReadinessArtifacts] = None) -> Optional[float]:
     """
     Build a prior from baseline_df using a hierarchy:
       1) exact (sector, region, size)
@@ -1048,15 +1367,11 @@ def _baseline_prior(sector: str, region: str, size: str) -> Optional[float]:
       4) size only
       5) global mean
     """
+    baseline_df = (arts or artifacts).baseline_df
     if baseline_df is None or baseline_df.empty:
         return None
 
-    share_cols = [
-        "baseline_growth_ready_share",
-        "baseline_ready_share",
-        "ready_share",
-    ]
-    col = next((c for c in share_cols if c in baseline_df.columns), None)
+    col = next((c for c in BASELINE_SHARE_COLS if c in baseline_df.columns), None)
     if not col:
         return None
 
@@ -1100,11 +1415,13 @@ def _baseline_prior(sector: str, region: str, size: str) -> Optional[float]:
 
 # ---------- Cohort stats (if your cohort has a usable prob/label column) ----------
 
-def _cohort_stats(sector: str, region: str, size: str, year: str) -> Tuple[int, Optional[float], Optional[str]]:
+def _cohort_stats_scan(sector: str, region: str, size: str, year: str,
+                       arts: Optional[ReadinessArtifacts] = None) -> Tuple[int, Optional[float], Optional[str]]:
     """
     Return (n, raw_mean, used_col) for the matched group in the given year.
     raw_mean is the mean of one of COHORT_PROB_COLUMNS if present; otherwise None.
     """
+    cohort_df = (arts or artifacts).cohort_df
     if cohort_df is None or cohort_df.empty:
         return 0, None, None
     try:
@@ -1136,8 +1453,110 @@ def _cohort_stats(sector: str, region: str, size: str, year: str) -> Tuple[int,
         log.warning(f"cohort lookup failed: {e}")
         return 0, None, None
 
+# ---------- Precomputed lookups (same results as the scans above, no pandas per request) ----------
+CAT_COLS = ["القطاع_العام", "المنطقة", "الحجم"]
+PRIOR_LEVELS = {                      # fallback order of _baseline_prior_scan
+    "exact":       ["القطاع_العام", "المنطقة", "الحجم"],
+    "sector_size": ["القطاع_العام", "الحجم"],
+    "sector":      ["القطاع_العام"],
+    "size":        ["الحجم"],
+}
+
+def _build_prior_tables(df: Optional[pd.DataFrame]) -> Optional[Dict[str, Any]]:
+    """{level: {(key values): mean}, "global": mean}; groups whose values are all NaN are left out, so lookups fall through."""
+    if df is None or df.empty:
+        return None
+    tables: Dict[str, Any] = {level: {} for level in PRIOR_LEVELS}
+    tables["global"] = None
+    col = next((c for c in BASELINE_SHARE_COLS if c in df.columns), None)
+    if not col or any(c not in df.columns for c in CAT_COLS):
+        return tables                 # the scan finds nothing (or raises) -> None at every level
+    vals = pd.to_numeric(df[col], errors="coerce")
+    for level, keys in PRIOR_LEVELS.items():
+        for key, idx in df.groupby(keys, sort=False).indices.items():
+            s = vals.iloc[idx].dropna()     # same rows, same order as the boolean-mask scan
+            if len(s):
+                tables[level][key if isinstance(key, tuple) else (key,)] = float(s.mean())
+    s = vals.dropna()
+    tables["global"] = float(s.mean()) if len(s) else None
+    return tables
+
+def _cohort_year_key(v: Any) -> Optional[str]:
+    """Year cell -> str(int) for integral numbers, the string itself for strings, None if it can never match."""
+    if isinstance(v, str):
+        return v
+    try:
+        f = float(v)
+    except (TypeError, ValueError):
+        return None
+    return str(int(f)) if f.is_integer() else None
+
+def _query_year_key(year: str) -> Optional[str]:
+    """Table key for a request year, or None when only the scan reproduces its matching (e.g. "02025")."""
+    try:
+        yi = int(year)
+    except Exception:
+        return year
+    return year if str(yi) == year else None
+
+def _build_cohort_table(df: Optional[pd.DataFrame]) -> Optional[Dict[tuple, Tuple[int, Optional[float], Optional[str]]]]:
+    """(sector, region, size, year key) -> (n, raw_mean, used_col); year key is None if there is no year column."""
+    if df is None or df.empty:
+        return None
+    if any(c not in df.columns for c in CAT_COLS):
+        return {}
+    has_year = "السنة" in df.columns
+    keys = [df[c] for c in CAT_COLS]
+    if has_year:
+        keys.append(df["السنة"].map(_cohort_year_key))
+    nums = [(c, pd.to_numeric(df[c], errors="coerce")) for c in COHORT_PROB_COLUMNS if c in df.columns]
+    table: Dict[tuple, Tuple[int, Optional[float], Optional[str]]] = {}
+    for key, idx in df.groupby(keys, sort=False).indices.items():
+        key = tuple(key) if has_year else tuple(key) + (None,)
+        stats: Tuple[int, Optional[float], Optional[str]] = (len(idx), None, None)
+        for col, vals in nums:
+            s = vals.iloc[idx].dropna()
+            if not s.empty:
+                stats = (len(idx), float(s.mean()), col)
+                break
+        table[key] = stats
+    return table
+
+def _build_lookups(arts: ReadinessArtifacts) -> None:
+    arts.prior_tables = _build_prior_tables(arts.baseline_df)
+    arts.cohort_table = _build_cohort_table(arts.cohort_df)
+    log.info(f"✅ predict lookups built: priors={sum(len(v) for k, v in (arts.prior_tables or {}).items() if k != 'global')}, "
+             f"cohort groups={len(arts.cohort_table or {})}")
+
+def _baseline_prior(sector: str, region: str, size: str,
+                    arts: Optional[ReadinessArtifacts] = None) -> Optional[float]:
+    arts = arts or artifacts
+    t = arts.prior_tables
+    if t is None:
+        return _baseline_prior_scan(sector, region, size, arts)
+    for level, key in (("exact", (sector, region, size)), ("sector_size", (sector, size)),
+                       ("sector", (sector,)), ("size", (size,))):
+        v = t[level].get(key)
+        if v is not None:
+            return v
+    return t["global"]
+
+def _cohort_stats(sector: str, region: str, size: str, year: str,
+                  arts: Optional[ReadinessArtifacts] = None) -> Tuple[int, Optional[float], Optional[str]]:
+    arts = arts or artifacts
+    t = arts.cohort_table
+    if t is None:
+        return _cohort_stats_scan(sector, region, size, year, arts)
+    has_year = arts.cohort_df is not None and "السنة" in arts.cohort_df.columns
+    yk = _query_year_key(year) if has_year else None
+    if has_year and yk is None:
+        return _cohort_stats_scan(sector, region, size, year, arts)
+    return t.get((sector, region, size, yk), (0, None, None))
+
 # ---------- Optional: use a model if it exposes predict_proba ----------
-def _model_prob_for(sector: str, region: str, size: str, year: str) -> Optional[float]:
+def _model_prob_for(sector: str, region: str, size: str, year: str,
+                    arts: Optional[ReadinessArtifacts] = None) -> Optional[float]:
+    model = (arts or artifacts).model
     try:
         if model is None:
             return None
@@ -1167,54 +1586,265 @@ def _model_prob_for(sector: str, region: str, size: str, year: str) -> Optional[
         log.warning(f"model inference failed: {e}")
         return None
 
+def _model_probs_for(rows: List[Tuple[str, str, str, str]],
+                     arts: Optional[ReadinessArtifacts] = None) -> List[Optional[float]]:
+    """_model_prob_for for many (sector, region, size, year) rows with one predict_proba call."""
+    arts = arts or artifacts
+    model = arts.model
+    if model is None or not rows:
+        return [None] * len(rows)
+    try:
+        df = pd.DataFrame(rows, columns=["القطاع_العام", "المنطقة", "الحجم", "السنة"])
+        if isinstance(model, dict) and callable(model.get("predict_proba")):
+            col = np.asarray(model["predict_proba"](df), dtype=float).ravel()
+        elif hasattr(model, "predict_proba"):
+            col = _positive_probas_from_estimator(model, df)
+        else:
+            return [None] * len(rows)
+        if col is None or len(col) != len(rows):
+            raise ValueError(f"expected {len(rows)} probabilities, got {None if col is None else len(col)}")
+        return [float(v) for v in col]
+    except Exception as e:
+        log.warning(f"batched model inference failed, predicting row by row: {e}")
+        return [_model_prob_for(*r, arts=arts) for r in rows]
+
+# ---------- Micro-batching of concurrent model calls ----------
+PREDICT_MICROBATCH_MS = float(os.getenv("PREDICT_MICROBATCH_MS", "2"))    # 0 = call the model directly
+PREDICT_MICROBATCH_MAX = int(os.getenv("PREDICT_MICROBATCH_MAX", "64"))
+PREDICT_MICROBATCH_WORKERS = int(os.getenv("PREDICT_MICROBATCH_WORKERS", "4"))  # concurrent model calls
+_BYPASS = object()   # batcher result telling a caller to run its own rows
+
+class ModelMicroBatcher:
+    """
+    Collects model rows from concurrent requests and runs them as one predict_proba.
+    Rows are only stacked with rows for the same model (`key`, the artifacts version
+    each request started with), so a reload never mixes versions inside a batch.
+
+    A collector thread takes the first waiting request and keeps collecting until
+    max_items rows are in hand or max_wait_ms has passed since that request arrived.
+    It then hands the stacked rows to one of `workers` model threads and goes straight
+    back to collecting, so a running model call never delays the next window. A request
+    never waits longer than max_wait_ms for its batch to start: it calls the model itself
+    when every model thread is busy and none is expected to free up before its deadline,
+    and a closed batch that finds no free thread is handed back to its callers the same way.
+    """
+    def __init__(self, fn, max_wait_ms: float, max_items: int, workers: int = 4):
+        self.fn = fn
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_items = max(1, max_items)
+        self.workers = max(1, workers)
+        self._queue: "deque[Tuple[Any, List[Any], Future, float]]" = deque()
+        self._cond = threading.Condition()
+        self._collector: Optional[threading.Thread] = None
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="predict-model")
+        self._running: Dict[int, float] = {}   # id(batch) -> start of its model call
+        self._call_time = 0.0                  # moving average of a model call, seconds
+        self._lag = 0.0                        # moving average of deadline -> model call start, seconds
+        self._stopped = False
+        self._delays = deque(maxlen=1024)   # seconds from submit to model call start, most recent requests
+        self._sizes: Dict[int, int] = {}    # rows per model call -> count
+        self.batches = self.rows = self.bypassed = 0
+
+    def submit(self, key: Any, rows: List[Any]) -> List[Optional[float]]:
+        """Blocks until this caller's rows are predicted; large or late calls skip the queue."""
+        if self._stopped or len(rows) >= self.max_items:
+            return self.fn(key, rows)
+        t = time.perf_counter()
+        fut: Future = Future()
+        with self._cond:
+            if not self._free_before(t + self.max_wait):
+                self.bypassed += 1
+                fut = None
+            else:
+                if self._collector is None or not self._collector.is_alive():
+                    self._collector = threading.Thread(target=self._collect, name="predict-microbatch", daemon=True)
+                    self._collector.start()
+                self._queue.append((key, rows, fut, t))
+                self._cond.notify()
+        if fut is not None:
+            out = fut.result()
+            if out is not _BYPASS:
+                return out
+        return self._direct(key, rows, t)
+
+    def _free_before(self, deadline: float) -> bool:
+        """Whether a model thread is idle, or expected to be by `deadline`. Caller holds _cond."""
+        if len(self._running) < self.workers:
+            return True
+        return min(self._running.values()) + self._call_time <= deadline
+
+    def _direct(self, key: Any, rows: List[Any], t: float) -> List[Optional[float]]:
+        with self._cond:
+            self._delays.append(time.perf_counter() - t)
+        return self.fn(key, rows)
+
+    def _take(self) -> Tuple[Any, List[Tuple[Any, List[Any], Future, float]], Optional[float]]:
+        """(key, batch, close time when the window expired, else None)."""
+        with self._cond:
+            while not self._queue and not self._stopped:
+                self._cond.wait()
+            if not self._queue:
+                return None, [], None
+            key = self._queue[0][0]
+            close = self._queue[0][3] + self.max_wait - self._lag   # leave room for the usual hand-off
+            expired = None
+            while sum(len(r) for k, r, _, _ in self._queue if k is key) < self.max_items and not self._stopped:
+                left = close - time.perf_counter()
+                if left <= 0:
+                    expired = close
+                    break
+                self._cond.wait(left)
+            batch, rest, n = [], deque(), 0
+            while self._queue:
+                item = self._queue.popleft()
+                if item[0] is key and (not batch or n + len(item[1]) <= self.max_items):
+                    batch.append(item)
+                    n += len(item[1])
+                else:
+                    rest.append(item)
+            self._queue = rest
+            return key, batch, expired
+
+    def _collect(self) -> None:
+        while True:
+            key, batch, expired = self._take()
+            if not batch:
+                return
+            with self._cond:
+                free = len(self._running) < self.workers
+                if free:
+                    self._running[id(batch)] = time.perf_counter()
+            if free:
+                self._pool.submit(self._call, key, batch, expired)
+            else:
+                # every model thread is still busy at the deadline: the callers run their own rows
+                for _, _, fut, _ in batch:
+                    fut.set_result(_BYPASS)
+                with self._cond:
+                    self.bypassed += len(batch)
+
+    def _call(self, key: Any, batch: List[Tuple[Any, List[Any], Future, float]],
+              expired: Optional[float]) -> None:
+        start = time.perf_counter()
+        if expired is not None:
+            with self._cond:
+                self._lag = 0.8 * self._lag + 0.2 * min(self.max_wait / 2, max(0.0, start - expired))
+        rows = [row for _, r, _, _ in batch for row in r]
+        try:
+            out = self.fn(key, rows)
+        except Exception as e:
+            for _, _, fut, _ in batch:
+                fut.set_exception(e)
+            return
+        finally:
+            with self._cond:
+                del self._running[id(batch)]
+                took = time.perf_counter() - start
+                self._call_time = took if not self._call_time else 0.8 * self._call_time + 0.2 * took
+        with self._cond:
+            self.batches += 1
+            self.rows += len(rows)
+            self._sizes[len(rows)] = self._sizes.get(len(rows), 0) + 1
+            self._delays.extend(start - t for _, _, _, t in batch)
+        i = 0
+        for _, r, fut, _ in batch:
+            fut.set_result(out[i:i + len(r)])
+            i += len(r)
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._pool.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            delays = sorted(self._delays)
+            sizes = dict(sorted(self._sizes.items()))
+        pct = lambda q: round(delays[min(len(delays) - 1, int(q * len(delays)))] * 1000, 3) if delays else None
+        return {
+            "max_wait_ms": self.max_wait * 1000, "max_items": self.max_items, "workers": self.workers,
+            "batches": self.batches, "rows": self.rows, "bypassed": self.bypassed,
+            "mean_batch_size": round(self.rows / self.batches, 2) if self.batches else None,
+            "batch_sizes": sizes,
+            "queue_delay_ms": {"p50": pct(0.50), "p95": pct(0.95), "max": pct(1.0)},
+        }
+
+model_batcher = ModelMicroBatcher(lambda arts, rows: _model_probs_for(rows, arts),
+                                  PREDICT_MICROBATCH_MS, PREDICT_MICROBATCH_MAX, PREDICT_MICROBATCH_WORKERS) \
+    if PREDICT_MICROBATCH_MS > 0 else None
+
+def _model_probs(rows: List[Tuple[str, str, str, str]], arts: ReadinessArtifacts) -> List[Optional[float]]:
+    return model_batcher.submit(arts, rows) if model_batcher is not None else _model_probs_for(rows, arts)
+
 # ---------- Predict (year fixed to 2025) ----------
-@app.post("/predict")
-def predict(payload: Dict[str, str] = Body(...)):
+PREDICT_YEAR = "2025"
+PREDICT_BATCH_MAX = int(os.getenv("PREDICT_BATCH_MAX", "1000"))
+
+def _predict_triple(payload: Dict[str, Any]) -> Tuple[str, str, str]:
     sector = str(payload.get("sector") or payload.get("القطاع_العام") or "").strip()
     region = str(payload.get("region") or payload.get("المنطقة") or "").strip()
     size   = str(payload.get("size")   or payload.get("الحجم")   or "").strip()
-    year   = "2025"
+    return sector, region, size
 
-    echo = {"القطاع_العام": sector, "المنطقة": region, "الحجم": size, "السنة": year}
-
-    has_baseline = baseline_df is not None and not baseline_df.empty
-    has_cohort   = cohort_df   is not None and not cohort_df.empty
-    has_model    = model is not None
-
-    # 1) hierarchical prior (defaults to 0.4, NOT 0.5)
-    prior = _baseline_prior(sector, region, size)
-    if prior is None:
-        prior = float(os.getenv("PRIOR_DEFAULT", "0.4"))
-
-    # 2) cohort stats
-    n, raw_mean, used_col = _cohort_stats(sector, region, size, year) if has_cohort else (0, None, None)
+def _predict_many(triples: List[Tuple[str, str, str]], year: str = PREDICT_YEAR,
+                  arts: Optional[ReadinessArtifacts] = None) -> List[Dict[str, Any]]:
+    """
+    /predict for many triples at once: priors and cohort stats from the lookups, one
+    predict_proba call for the rows without a cohort mean, and the smoothing/clipping
+    as array operations. Returns one /predict response per triple, in input order.
+    """
+    arts = arts or artifacts
+    has_baseline = arts.baseline_df is not None and not arts.baseline_df.empty
+    has_cohort   = arts.cohort_df   is not None and not arts.cohort_df.empty
+    has_model    = arts.model is not None
+    prior_default = float(os.getenv("PRIOR_DEFAULT", "0.4"))
+    alpha = float(os.getenv("CALIB_ALPHA", "25"))  # weight of the prior
+    clip_lo = float(os.getenv("CALIB_CLIP_LO", "0.05"))
+    clip_hi = float(os.getenv("CALIB_CLIP_HI", "0.95"))
 
+    # 1) hierarchical prior (defaults to 0.4, NOT 0.5) and 2) cohort stats
+    priors = [_baseline_prior(s, r, z, arts) for s, r, z in triples]
+    priors = np.array([prior_default if p is None else p for p in priors], dtype=float)
+    stats = [_cohort_stats(s, r, z, year, arts) if has_cohort else (0, None, None) for s, r, z in triples]
+    n = np.array([st[0] for st in stats], dtype=float)
+    has_mean = np.array([st[1] is not None for st in stats], dtype=bool)
+    raw = np.array([st[1] if st[1] is not None else 0.0 for st in stats], dtype=float)
 
     # 3) combine: cohort (if real) with Bayesian smoothing; else model; else prior
-    alpha = float(os.getenv("CALIB_ALPHA", "25"))  # weight of the prior
-    probability: Optional[float] = None
-    prob_source: str = "unknown"
-    cohort_estimate: Optional[float] = None
-
-    if raw_mean is not None:
-        sum_ready = raw_mean * n
-        probability = (sum_ready + alpha * prior) / (n + alpha)
-        prob_source = f"cohort_calibrated:{used_col}"
-        cohort_estimate = raw_mean
-    else:
-        model_prob = _model_prob_for(sector, region, size, year) if has_model else None
-        if model_prob is not None:
-            probability = float(model_prob)
+    model_prob = np.full(len(triples), np.nan)
+    need_model = np.flatnonzero(~has_mean) if has_model else np.array([], dtype=int)
+    if len(need_model):
+        got = _model_probs([(*triples[i], year) for i in need_model], arts)
+        model_prob[need_model] = [np.nan if v is None else v for v in got]
+    has_model_prob = ~np.isnan(model_prob)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        smoothed = (raw * n + alpha * priors) / (n + alpha)
+    probability = np.where(has_mean, smoothed, np.where(has_model_prob, model_prob, priors))
+
+    # 4) clamp to avoid crazy edges
+    probability = np.minimum(clip_hi, probability)
+    probability = np.maximum(clip_lo, probability)
+
+    out = []
+    for i, (sector, region, size) in enumerate(triples):
+        count, raw_mean, used_col = stats[i]
+        if has_mean[i]:
+            prob_source = f"cohort_calibrated:{used_col}"
+        elif has_model_prob[i]:
             prob_source = "model"
         else:
-            probability = float(prior)  # meaningful prior (e.g., 0.4)
             prob_source = "prior_only"
-
-    # 4) clamp to avoid crazy edges
-    clip_lo = float(os.getenv("CALIB_CLIP_LO", "0.05"))
-    clip_hi = float(os.getenv("CALIB_CLIP_HI", "0.95"))
-    probability = max(clip_lo, min(clip_hi, float(probability)))
-
+        out.append(_predict_response(
+            sector, region, size, year, float(probability[i]), float(priors[i]), count, raw_mean,
+            prob_source, has_baseline, has_cohort, arts.version))
+    return out
+
+def _predict_response(sector: str, region: str, size: str, year: str, probability: float, prior: float,
+                      n: int, raw_mean: Optional[float], prob_source: str,
+                      has_baseline: bool, has_cohort: bool, version: Optional[str]) -> Dict[str, Any]:
+    echo = {"القطاع_العام": sector, "المنطقة": region, "الحجم": size, "السنة": year}
+    cohort_estimate = raw_mean
     tier = _tier_from_prob(probability)
     pred = int(probability >= 0.5)
 
@@ -1247,5 +1877,130 @@ def predict(payload: Dict[str, str] = Body(...)):
             "raw_mean": raw_mean,
             "prior": prior,
             "confidence": confidence,
+            "artifact_version": version,
         },
     }
+
+# ---------- Full-grid precomputation (/options is a closed 17 x 13 x 3 space) ----------
+PROB_SOURCES_FIXED = ("model", "prior_only")   # plus one "cohort_calibrated:<col>" per cohort column
+
+class PredictionGrid:
+    """
+    /predict responses for every (sector, region, size) of /options, held as parallel
+    arrays indexed [sector, region, size]; a response dict is rebuilt from one cell on demand.
+    """
+    def __init__(self, sectors: List[str], regions: List[str], sizes: List[str], year: str,
+                 responses: List[Dict[str, Any]], version: str):
+        self.index = ({v: i for i, v in enumerate(sectors)}, {v: i for i, v in enumerate(regions)},
+                      {v: i for i, v in enumerate(sizes)})
+        self.year, self.version = year, version
+        shape = (len(sectors), len(regions), len(sizes))
+        ms = [r["meta"] for r in responses]
+        self.sources = list(PROB_SOURCES_FIXED) + sorted({m["prob_source"] for m in ms} - set(PROB_SOURCES_FIXED))
+        self.probability = np.array([r["probability"] for r in responses], dtype=np.float64).reshape(shape)
+        self.prior = np.array([m["prior"] for m in ms], dtype=np.float64).reshape(shape)
+        self.n = np.array([m["n"] for m in ms], dtype=np.int64).reshape(shape)
+        self.raw_mean = np.array([np.nan if m["raw_mean"] is None else m["raw_mean"] for m in ms],
+                                 dtype=np.float64).reshape(shape)
+        self.source = np.array([self.sources.index(m["prob_source"]) for m in ms], dtype=np.int8).reshape(shape)
+        self.has_baseline = bool(ms[0]["has_baseline"]) if ms else False
+        self.has_cohort = bool(ms[0]["has_cohort"]) if ms else False
+
+    def cell(self, sector: str, region: str, size: str) -> Optional[Tuple[int, int, int]]:
+        i, j, k = self.index[0].get(sector), self.index[1].get(region), self.index[2].get(size)
+        return None if i is None or j is None or k is None else (i, j, k)
+
+    def etag(self, cell: Tuple[int, int, int]) -> str:
+        return f'"{self.version}-{cell[0]}.{cell[1]}.{cell[2]}"'
+
+    def response(self, sector: str, region: str, size: str, cell: Tuple[int, int, int]) -> Dict[str, Any]:
+        raw = float(self.raw_mean[cell])
+        return _predict_response(sector, region, size, self.year, float(self.probability[cell]),
+                                 float(self.prior[cell]), int(self.n[cell]), None if np.isnan(raw) else raw,
+                                 self.sources[self.source[cell]], self.has_baseline, self.has_cohort, self.version)
+
+def _build_prediction_grid(arts: ReadinessArtifacts) -> None:
+    opts = get_options()
+    sectors, regions, sizes = opts["sector"], opts["region"], opts["size"]
+    triples = [(s, r, z) for s in sectors for r in regions for z in sizes]
+    arts.grid = PredictionGrid(sectors, regions, sizes, PREDICT_YEAR, _predict_many(triples, arts=arts), arts.version)
+    log.info(f"✅ prediction grid built: {len(triples)} combinations, artifact version {arts.version}")
+
+def _predict_one(triple: Tuple[str, str, str],
+                 arts: Optional[ReadinessArtifacts] = None) -> Tuple[Dict[str, Any], Optional[str]]:
+    """(response, ETag): from the grid when the triple is one of /options, else computed (no ETag)."""
+    arts = arts or artifacts
+    grid = arts.grid
+    cell = grid.cell(*triple) if grid is not None else None
+    if cell is None:
+        return _predict_many([triple], arts=arts)[0], None
+    return grid.response(*triple, cell), grid.etag(cell)
+
+_ENTITY_TAG = re.compile(r'\*|(?:W/)?"[^"]*"')
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match as a list of entity tags: weak comparison (W/ ignored), "*" matches any."""
+    for tag in _ENTITY_TAG.findall(if_none_match or ""):
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+@app.get("/predict")
+def predict_cached(request: Request, response: Response):
+    """
+    Cacheable /predict: ?sector=&region=&size= (or the Arabic keys). Grid triples carry
+    an ETag and answer If-None-Match with 304; other triples are computed, uncached.
+    """
+    result, etag = _predict_one(_predict_triple(dict(request.query_params)), artifacts)   # one version for the whole request
+    if etag:
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"   # revalidate; the tag changes with the artifacts
+    return result
+
+@app.post("/predict")
+def predict(payload: Dict[str, str] = Body(...)):
+    return _predict_one(_predict_triple(payload), artifacts)[0]
+
+@app.get("/predict/stats")
+def predict_stats():
+    arts = artifacts
+    return {
+        "artifact_version": arts.version,
+        "loaded_at": arts.loaded_at,
+        "load_errors": arts.errors or None,
+        "last_reload": last_reload or None,
+        "grid_cells": int(arts.grid.probability.size) if arts.grid is not None else 0,
+        "model_microbatch": model_batcher.stats() if model_batcher is not None else None,
+    }
+
+@app.post("/admin/artifacts/reload")
+def admin_reload_artifacts(force: bool = False, x_admin_token: str = Header(default="")):
+    """Reload the readiness artifacts now; 409 (old version kept) if the new files do not validate."""
+    if not ADMIN_TOKEN or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    status = reload_artifacts(force=force, reason="admin")
+    if not status["ok"]:
+        raise HTTPException(status_code=409, detail=status)
+    return status
+
+@app.post("/predict/batch")
+def predict_batch(payload: Dict[str, Any] = Body(...)):
+    """
+    {"items": [{"sector", "region", "size"}, ...]} -> {"ok", "count", "results"}; each result is
+    what /predict returns for that item, in the same order.
+    """
+    items = payload.get("items")
+    if not isinstance(items, list) or not all(isinstance(it, dict) for it in items):
+        raise HTTPException(status_code=422, detail="Body must be {\"items\": [{\"sector\", \"region\", \"size\"}, ...]}")
+    if len(items) > PREDICT_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {PREDICT_BATCH_MAX} items per batch")
+    triples = [_predict_triple(it) for it in items]
+    arts = artifacts
+    grid = arts.grid
+    cells = [grid.cell(*t) if grid is not None else None for t in triples]
+    misses = [t for t, c in zip(triples, cells) if c is None]
+    computed = iter(_predict_many(misses, arts=arts)) if misses else iter(())
+    results = [grid.response(*t, c) if c is not None else next(computed) for t, c in zip(triples, cells)]
+    return {"ok": True, "count": len(results), "results": results}
@@ -0,0 +1,57 @@
+# back/test_predict_batcher.py
+"""
+ModelMicroBatcher must never hold a request longer than its window, even while
+a slow model call is running.
+
+    python back/test_predict_batcher.py      (from the repo root, like the app)
+
+Needs the same env as the app (main.py connects to Supabase on import).
+"""
+import random, threading, time, unittest
+
+import main as app
+
+MODEL_MS = 30       # much slower than the window, so requests keep arriving mid-call
+MAX_WAIT_MS = 5
+SLACK_MS = 3        # thread wake-up jitter; far below the MODEL_MS a blocking collector would add
+
+
+class ModelMicroBatcherTest(unittest.TestCase):
+    def _load(self, workers: int, threads: int = 40, per_thread: int = 20):
+        def slow_model(key, rows):
+            time.sleep(MODEL_MS / 1000)
+            return [float(r) for r in rows]
+
+        batcher = app.ModelMicroBatcher(slow_model, MAX_WAIT_MS, 64, workers)
+        errors = []
+
+        def client(n: int):
+            for i in range(per_thread):
+                time.sleep(random.random() * 0.005)
+                row = n * 1000 + i
+                if batcher.submit("v1", [row]) != [float(row)]:
+                    errors.append(row)
+
+        ts = [threading.Thread(target=client, args=(n,)) for n in range(threads)]
+        for t in ts:
+            t.start()
+        for t in ts:
+            t.join()
+        batcher.stop()
+        return batcher.stats(), errors
+
+    def test_queue_delay_within_max_wait(self):
+        for workers in (1, 4):
+            with self.subTest(workers=workers):
+                stats, errors = self._load(workers)
+                self.assertEqual(errors, [])
+                self.assertLessEqual(stats["queue_delay_ms"]["max"], MAX_WAIT_MS + SLACK_MS, stats)
+                self.assertGreater(stats["batches"], 0)
+
+    def test_rows_are_batched(self):
+        stats, _ = self._load(workers=4)
+        self.assertGreater(stats["mean_batch_size"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
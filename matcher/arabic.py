@@ -0,0 +1,26 @@
+# matcher/arabic.py
+import re
+import unicodedata
+from typing import List
+
+_DIACRITICS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")  # harakat + tatweel
+_NON_WORD = re.compile(r"\W+")  # unicode-aware: keeps Arabic letters, drops ، ؛ ؟
+_AR_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩", "0123456789")
+
+def normalize_ar(s: str) -> str:
+    """Fold Arabic spelling variants so lookups do not depend on orthography."""
+    s = unicodedata.normalize("NFKC", s or "").translate(_AR_DIGITS)
+    s = _DIACRITICS.sub("", s)
+    s = re.sub("[إأآٱ]", "ا", s)
+    s = s.replace("ى", "ي").replace("ة", "ه").replace("ؤ", "و").replace("ئ", "ي")
+    return re.sub(r"\s+", " ", s).strip().lower()
+
+def strip_al(tok: str) -> str:
+    # drop the definite article (and و/ب/ل + ال) from longer tokens
+    for pre in ("وال", "بال", "لل", "ال"):
+        if tok.startswith(pre) and len(tok) - len(pre) >= 2:
+            return tok[len(pre):]
+    return tok
+
+def tokens_ar(s: str) -> List[str]:
+    return [strip_al(t) for t in _NON_WORD.sub(" ", normalize_ar(s)).split() if t]
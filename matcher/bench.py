@@ -0,0 +1,175 @@
+# matcher/bench.py
+"""
+Ad-hoc benchmarks for the matcher pipeline (needs OPENAI_API_KEY and a built index).
+
+    python -m matcher.bench batch [--k 10] [--batch-size 5]
+    python -m matcher.bench cascade [--k 10] [--top-k 5]
+    python -m matcher.bench vectorstore [--n 50]
+    python -m matcher.bench retrieval [--n 200] [--k 10]   (no API calls)
+"""
+import argparse, json, math, pathlib, time
+from typing import Any, Callable, Dict, List
+
+from dotenv import load_dotenv, find_dotenv
+from langchain_community.callbacks import get_openai_callback
+
+load_dotenv(find_dotenv())
+
+from .vectorstore import get_vectordb, close_vectordb
+from .config import PERSIST_DIR, COLLECTION, EMBED_MODEL, NPINDEX_DIR
+from .retrieval import retrieve_candidates
+from .scoring import rank_with_llm_granular, rank_with_llm_batched, prefilter_candidates
+
+FIXTURES = pathlib.Path(__file__).parent / "fixtures" / "projects.json"
+
+
+def load_fixture_projects() -> List[Dict[str, Any]]:
+    return json.loads(FIXTURES.read_text(encoding="utf-8"))
+
+def _measure(fn: Callable[[], Any]) -> Dict[str, Any]:
+    with get_openai_callback() as cb:
+        t0 = time.perf_counter()
+        out = fn()
+        dt = time.perf_counter() - t0
+    return {"out": out, "seconds": dt, "prompt_tokens": cb.prompt_tokens,
+            "completion_tokens": cb.completion_tokens, "requests": cb.successful_requests}
+
+def _print_row(label: str, m: Dict[str, Any]) -> None:
+    print(f"  {label:<12} {m['seconds']:7.2f}s  requests={m['requests']:<3} "
+          f"prompt_tokens={m['prompt_tokens']:<7} completion_tokens={m['completion_tokens']}")
+
+
+def bench_batch(args) -> None:
+    """
+    Per-candidate vs batched scoring: wall time and token usage per fixture project.
+    The score cache is bypassed on both sides, so both pay for every call.
+    """
+    vdb = get_vectordb()
+    for project in load_fixture_projects():
+        cands = retrieve_candidates(vdb, project, k=args.k)
+        single = _measure(lambda: rank_with_llm_granular(project, cands, use_cache=False))
+        batched = _measure(lambda: rank_with_llm_batched(project, cands, batch_size=args.batch_size,
+                                                            use_cache=False))
+        print(f"{project['slug']} (k={len(cands)})")
+        _print_row("per-candidate", single)
+        _print_row(f"batch={args.batch_size}", batched)
+        top_a = [r["doc"].metadata.get("id") for r in single["out"][:5]]
+        top_b = [r["doc"].metadata.get("id") for r in batched["out"][:5]]
+        print(f"  top-5 overlap: {len(set(top_a) & set(top_b))}/5")
+
+
+def bench_cascade(args) -> None:
+    """
+    Accuracy vs cost of the cheap-prefilter cascade. Every retrieved candidate is
+    LLM-scored once (the reference); LLM scores are per-candidate, so the cascade
+    result for any keep size is the reference ranking restricted to the kept set.
+    LLM calls are counted, not measured, so the reference may come from the score cache.
+    """
+    vdb = get_vectordb()
+    factors = [float(f) for f in args.factors.split(",")]
+    totals = {f: {"recall": 0.0, "top1": 0, "calls": 0} for f in factors}
+    projects = load_fixture_projects()
+    full_calls = 0
+    for project in projects:
+        cands = retrieve_candidates(vdb, project, k=args.k)
+        ref = rank_with_llm_granular(project, cands)
+        full_calls += len(cands)
+        ref_top = [id(r["doc"]) for r in ref[:args.top_k]]
+        for f in factors:
+            kept, _ = prefilter_candidates(project, cands, math.ceil(f * args.top_k))
+            kept_ids = {id(doc) for doc, _ in kept}
+            got = [i for i in (id(r["doc"]) for r in ref) if i in kept_ids][:args.top_k]
+            totals[f]["recall"] += len(set(got) & set(ref_top)) / max(1, len(ref_top))
+            totals[f]["top1"] += int(bool(got) and got[0] == ref_top[0])
+            totals[f]["calls"] += len(kept)
+
+    n = len(projects)
+    print(f"{n} fixture projects, k={args.k}, top_k={args.top_k}; full LLM calls={full_calls}")
+    print(f"  {'keep':<14}{'LLM calls':>10}{'saved':>8}{'top-k recall':>14}{'top-1 agree':>13}")
+    for f in factors:
+        t = totals[f]
+        print(f"  {f'{f}x top_k':<14}{t['calls']:>10}{1 - t['calls'] / max(1, full_calls):>8.0%}"
+              f"{t['recall'] / n:>14.2f}{t['top1'] / n:>13.2f}")
+
+
+def bench_vectorstore(args) -> None:
+    """Per-request setup cost: new OpenAIEmbeddings + Chroma each call vs the pooled handle."""
+    from langchain_openai import OpenAIEmbeddings
+    from langchain_chroma import Chroma
+
+    def cold():
+        vdb = Chroma(collection_name=COLLECTION, persist_directory=PERSIST_DIR,
+                     embedding_function=OpenAIEmbeddings(model=EMBED_MODEL))
+        return vdb._collection.count()
+
+    def pooled():
+        return get_vectordb()._collection.count()
+
+    close_vectordb()
+    t0 = time.perf_counter(); cold(); first = time.perf_counter() - t0
+    for label, fn in (("per-request", cold), ("pooled", pooled)):
+        fn()
+        t0 = time.perf_counter()
+        for _ in range(args.n):
+            fn()
+        dt = (time.perf_counter() - t0) / args.n
+        print(f"  {label:<12} {dt * 1000:8.2f} ms/request")
+    print(f"  first open   {first * 1000:8.2f} ms (paid once at startup when warmed)")
+
+
+def bench_retrieval(args) -> None:
+    """Chroma HNSW vs NumPy exact search, by vector (query embedding excluded from both)."""
+    import numpy as np
+    from langchain_chroma import Chroma
+    from .npindex import NumpyIndex
+
+    chroma = Chroma(collection_name=COLLECTION, persist_directory=PERSIST_DIR)
+    npi = NumpyIndex.load(NPINDEX_DIR)
+    rng = np.random.default_rng(0)
+    base = np.asarray(npi.matrix)
+    queries = [base[i % len(base)] + rng.normal(0, 0.02, base.shape[1]).astype(np.float32) for i in range(args.n)]
+
+    def run(search):
+        t0 = time.perf_counter()
+        out = [search(q.tolist(), k=args.k) for q in queries]
+        return out, (time.perf_counter() - t0) / args.n
+
+    c_out, c_dt = run(chroma.similarity_search_by_vector_with_relevance_scores)
+    n_out, n_dt = run(npi.similarity_search_by_vector_with_score)
+    same = sum([d.metadata.get("id") for d, _ in a] == [d.metadata.get("id") for d, _ in b]
+               for a, b in zip(c_out, n_out))
+    gap = max(abs(x - y) for a, b in zip(c_out, n_out) for (_, x), (_, y) in zip(a, b))
+    print(f"  chroma  {c_dt * 1000:8.3f} ms/query")
+    print(f"  numpy   {n_dt * 1000:8.3f} ms/query")
+    print(f"  identical top-{args.k} order: {same}/{args.n}, max distance gap {gap:.2e}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("batch", help="per-candidate vs batched LLM scoring")
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--batch-size", type=int, default=5)
+    p.set_defaults(func=bench_batch)
+
+    p = sub.add_parser("cascade", help="accuracy vs cost of the cheap prefilter")
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--top-k", type=int, default=5)
+    p.add_argument("--factors", default="1,1.5,2")
+    p.set_defaults(func=bench_cascade)
+
+    p = sub.add_parser("vectorstore", help="per-request vs pooled vector store setup")
+    p.add_argument("--n", type=int, default=50)
+    p.set_defaults(func=bench_vectorstore)
+
+    p = sub.add_parser("retrieval", help="Chroma vs NumPy exact-search latency")
+    p.add_argument("--n", type=int, default=200)
+    p.add_argument("--k", type=int, default=10)
+    p.set_defaults(func=bench_retrieval)
+
+    args = ap.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
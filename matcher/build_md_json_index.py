@@ -1,12 +1,19 @@
 # build_md_json_index.py
-import os, json, pathlib, re
-from typing import Dict, Any
+import os, json, pathlib, re, hashlib, argparse, time, unicodedata, random
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional
 from dotenv import load_dotenv
 from langchain_openai import OpenAIEmbeddings
 from langchain_core.documents import Document
 from langchain_chroma import Chroma
 from langchain_community.vectorstores.utils import filter_complex_metadata
-from .extractor import run as extract_program  # <-- uses the robust extractor above
+from .extractor import extract_with_report, SYSTEM_INSTRUCTIONS  # rules first, LLM only for gaps
+from .ratelimit import RateLimiter
+from .tokens import count_tokens
+from .embed_cache import cached_embeddings
+from .npindex import write_index, index_exists
+from .lexical import BM25Index
+from .catalog import ProgramCatalog, index_text, index_extras
 
 HERE = pathlib.Path(__file__).parent
 ROOT = HERE.parent
@@ -15,43 +22,138 @@ OUT_DIR = ROOT / "data" / "programs"
 PERSIST_DIR = os.getenv("PERSIST_DIR", "chroma_rag")
 COLLECTION  = os.getenv("COLLECTION", "programs_index")
 EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-small")
+NPINDEX_DIR = os.getenv("NPINDEX_DIR") or str(ROOT / "np_index")
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH") or str(ROOT / "np_index" / "bm25.json")
+CATALOG_PATH = os.getenv("CATALOG_PATH") or str(ROOT / "np_index" / "catalog.pkl")
+# md file name -> {md_sha, program_id}; lets md_to_json skip files whose content did not change
+MANIFEST_PATH = pathlib.Path(os.getenv("BUILD_MANIFEST") or str(ROOT / "data" / "programs_manifest.json"))
+# parallel extraction: worker threads share one client and one request/token budget
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "4"))
+EXTRACT_RPM = float(os.getenv("EXTRACT_RPM", "300"))          # 0 = unlimited
+EXTRACT_TPM = float(os.getenv("EXTRACT_TPM", "150000"))       # 0 = unlimited
+EXTRACT_RETRIES = int(os.getenv("EXTRACT_RETRIES", "3"))
+EXTRACT_OUTPUT_TOKENS = 1500                                  # completion budget reserved per call
 
 for cand in (ROOT / ".env", HERE / ".env"):
     if cand.exists():
         load_dotenv(dotenv_path=str(cand), override=False); break
 
+def _sha(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def load_manifest() -> Dict[str, Dict[str, Any]]:
+    if MANIFEST_PATH.exists():
+        return json.loads(MANIFEST_PATH.read_text(encoding="utf-8")).get("files", {})
+    # first incremental run: adopt the program JSONs already on disk by their source file name
+    # (NFC-compared: source_path may have been written on macOS, which stores names decomposed)
+    by_name = {unicodedata.normalize("NFC", p.name): p for p in MD_DIR.glob("*.md")}
+    adopted = {}
+    for fp in sorted(OUT_DIR.glob("*.json")):
+        p = json.loads(fp.read_text(encoding="utf-8"))
+        md_path = by_name.get(unicodedata.normalize("NFC", pathlib.PurePath(p.get("source_path") or "").name))
+        if p.get("id") and md_path is not None:
+            md = md_path.read_text(encoding="utf-8", errors="ignore")
+            adopted[md_path.name] = {"md_sha": _sha(md), "program_id": p["id"]}
+    return adopted
+
+def save_manifest(files: Dict[str, Dict[str, Any]]) -> None:
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = MANIFEST_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"files": files}, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, MANIFEST_PATH)
+
 def make_unique_slug(base: str, taken: set[str]) -> str:
     slug = base; n = 2
-    while (OUT_DIR / f"{slug}.json").exists() or slug in taken:
+    while slug in taken:
         slug = f"{base}-{n}"; n += 1
     taken.add(slug)
     return slug
 
-def md_to_json():
+def _slugify(raw: Optional[str]) -> str:
+    slug = re.sub(r"[^0-9A-Za-z\u0600-\u06FF-]+", "-", raw or "program").strip("-").lower()
+    return slug or "program"
+
+def _extract_with_retry(md: str, limiter: RateLimiter, retries: int = EXTRACT_RETRIES):
+    """(data, report); the rate limit is only charged when the extractor actually calls the LLM."""
+    gate = lambda chunk: limiter.acquire(count_tokens(SYSTEM_INSTRUCTIONS + chunk) + EXTRACT_OUTPUT_TOKENS)
+    for attempt in range(retries + 1):
+        try:
+            return extract_with_report(md, notes="", raise_errors=True, before_llm=gate)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(min(60.0, 2.0 ** attempt) * (0.5 + random.random()))   # jittered backoff
+
+def md_to_json(force: bool = False, workers: int = EXTRACT_WORKERS) -> Dict[str, List[str]]:
+    """
+    Extract new / changed Markdown files into OUT_DIR/{id}.json and drop the JSON of removed
+    ones. A file keeps its program id across edits, so its vector is upserted, not duplicated.
+    Files are extracted on `workers` threads under the EXTRACT_RPM / EXTRACT_TPM budget; the
+    manifest is saved after every file, so a crashed run resumes where it stopped. Files that
+    still fail after EXTRACT_RETRIES are reported and retried on the next run.
+    Returns {"extracted", "removed", "unchanged", "failed"} lists (ids, or file names for failed).
+    """
     OUT_DIR.mkdir(parents=True, exist_ok=True)
-    converted, seen = [], set()
     md_files = sorted(MD_DIR.glob("*.md"))
     if not md_files:
         raise SystemExit(f"No Markdown files found in {MD_DIR.resolve()}")
 
+    manifest = load_manifest()
+    names = {p.name for p in md_files}
+    removed = [manifest.pop(name)["program_id"] for name in sorted(set(manifest) - names)]
+    for pid in removed:
+        (OUT_DIR / f"{pid}.json").unlink(missing_ok=True)
+
+    todo, unchanged = [], []
     for md_path in md_files:
         md = md_path.read_text(encoding="utf-8", errors="ignore")
-        data: Dict[str, Any] = extract_program(md, notes="")  # LLM + fallback
-        # id normalization + de-dupe across run
-        slug = data.get("id") or "program"
-        slug = re.sub(r"[^0-9A-Za-z\u0600-\u06FF-]+", "-", slug).strip("-").lower() or "program"
-        slug = make_unique_slug(slug, seen)
+        md_sha = _sha(md)
+        entry = manifest.get(md_path.name)
+        if (not force and entry and entry["md_sha"] == md_sha
+                and (OUT_DIR / f"{entry['program_id']}.json").exists()):
+            unchanged.append(entry["program_id"])
+        else:
+            todo.append((md_path, md, md_sha))
 
-        data["id"] = slug
-        data["source_path"] = md_path.as_posix()
+    taken = {e["program_id"] for e in manifest.values()}
+    limiter = RateLimiter(rpm=EXTRACT_RPM, tpm=EXTRACT_TPM)
+    extracted, failed = [], []
+    llm_calls = 0
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(_extract_with_retry, md, limiter): (md_path, md_sha) for md_path, md, md_sha in todo}
+        for n, fut in enumerate(as_completed(futures), 1):
+            md_path, md_sha = futures[fut]
+            try:
+                data, report = fut.result()
+            except Exception as e:
+                failed.append(md_path.name)
+                print(f"[{n}/{len(todo)}] ✗ {md_path.name}: {e}")
+                continue
+            # a known file keeps its id; a new one gets a slug unique across the catalog
+            entry = manifest.get(md_path.name)
+            slug = entry["program_id"] if entry else make_unique_slug(_slugify(data.get("id")), taken)
 
-        out_path = OUT_DIR / f"{slug}.json"
-        out_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
-        converted.append(out_path.name)
+            data["id"] = slug
+            data["source_path"] = md_path.as_posix()
 
-    print("OK:", len(converted), "files saved to", OUT_DIR.as_posix())
+            out_path = OUT_DIR / f"{slug}.json"
+            out_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+            manifest[md_path.name] = {"md_sha": md_sha, "program_id": slug,
+                                      "confidence": report["confidence"], "llm_fields": report["llm_fields"]}
+            save_manifest(manifest)          # per file, so an interrupted run keeps its progress
+            extracted.append(slug)
+            llm_calls += report["llm_calls"]
+            via = f"llm: {', '.join(report['llm_fields'])}" if report["llm_fields"] else "rules"
+            print(f"[{n}/{len(todo)}] ✓ {md_path.name} → {slug} [{via}] ({time.perf_counter() - t0:.1f}s)")
 
-def json_to_chroma():
+    save_manifest(manifest)
+    print(f"OK: {len(extracted)} extracted ({llm_calls} LLM calls), {len(unchanged)} unchanged, "
+          f"{len(removed)} removed, {len(failed)} failed → {OUT_DIR.as_posix()}"
+          + (f" (rate limiter waited {limiter.waited:.1f}s)" if limiter.waited else ""))
+    return {"extracted": extracted, "removed": removed, "unchanged": unchanged, "failed": failed}
+
+def load_program_docs() -> List[Document]:
     json_files = sorted(OUT_DIR.glob("*.json"))
     if not json_files:
         raise SystemExit(f"No JSON files found under {OUT_DIR.resolve()} — run MD step first.")
@@ -59,36 +161,129 @@ def json_to_chroma():
     docs = []
     for fp in json_files:
         p = json.loads(fp.read_text(encoding="utf-8"))
-        index_text = "\n".join([
-            p.get("name","") or "",
-            p.get("description","") or "",
-            p.get("objectives","") or p.get("objectives_text","") or "",
-            "Goals "       + ", ".join(p.get("goals", []) or []),
-            "Features "    + ", ".join(p.get("features", []) or []),
-            "Eligibility " + ", ".join(p.get("eligibility_must", []) or []),
-            "Sectors "     + ", ".join(p.get("sector_tags", []) or []),
-            "Stages "      + ", ".join(p.get("stage_tags", []) or []),
-        ]).strip()
-
-        doc = Document(page_content=index_text, metadata=p)
+        # lists are dropped below, so derive the scalar fields from the full record first
+        doc = Document(page_content=index_text(p), metadata={**p, **index_extras(p)})
         doc = filter_complex_metadata([doc])[0]
         docs.append(doc)
 
     print(f"Loaded {len(docs)} program docs from {OUT_DIR.as_posix()}")
+    return docs
 
+def _embeddings():
     if not os.getenv("OPENAI_API_KEY"):
         raise SystemExit("OPENAI_API_KEY is missing in your .env")
+    # unchanged index_text -> cached vector, only edited/new programs hit the API
+    return cached_embeddings(OpenAIEmbeddings(model=EMBED_MODEL), EMBED_MODEL)
 
-    embeddings = OpenAIEmbeddings(model=EMBED_MODEL)
-    Chroma.from_documents(
-        documents=docs,
-        embedding=embeddings,
+def _open_collection(embeddings=None) -> Chroma:
+    return Chroma(
         collection_name=COLLECTION,
         persist_directory=PERSIST_DIR,
+        embedding_function=embeddings,
         collection_metadata={"hnsw:space": "cosine"},
     )
-    print(f"✅ Chroma index ready → collection='{COLLECTION}', persist='{PERSIST_DIR}'")
+
+def json_to_chroma() -> Dict[str, int]:
+    """
+    Sync the collection with OUT_DIR, keyed by program id. Only programs whose index text is
+    new are embedded; metadata-only changes and re-keyed records (unkeyed duplicates from older
+    full rebuilds) reuse the stored vector, and vectors whose program is gone are deleted.
+    """
+    docs = load_program_docs()
+    vdb = _open_collection()
+    stored = vdb._collection.get(include=["documents", "metadatas", "embeddings"])
+    have = {i: (t, m) for i, t, m in zip(stored["ids"], stored["documents"], stored["metadatas"])}
+    vector_for = {t: e for t, e in zip(stored["documents"], stored["embeddings"])}
+    current = {d.metadata["id"]: d for d in docs}
+
+    stale = [i for i in have if i not in current]
+    changed = [d for pid, d in current.items() if have.get(pid) != (d.page_content, d.metadata)]
+    reuse = [d for d in changed if d.page_content in vector_for]
+    to_embed = [d for d in changed if d.page_content not in vector_for]
+
+    # chroma merges metadata on upsert/update, so changed records are deleted and re-added
+    drop = stale + [d.metadata["id"] for d in changed if d.metadata["id"] in have]
+    if drop:
+        vdb._collection.delete(ids=drop)
+    if reuse:
+        vdb._collection.add(ids=[d.metadata["id"] for d in reuse],
+                            embeddings=[vector_for[d.page_content] for d in reuse],
+                            documents=[d.page_content for d in reuse],
+                            metadatas=[d.metadata for d in reuse])
+    if to_embed:
+        vdb = _open_collection(_embeddings())
+        vdb.add_documents(to_embed, ids=[d.metadata["id"] for d in to_embed])
+    stats = {"embedded": len(to_embed), "reused": len(reuse), "deleted": len(stale),
+             "unchanged": len(docs) - len(changed)}
+    print(f"✅ Chroma index synced → {stats}, collection='{COLLECTION}', persist='{PERSIST_DIR}'")
+    return stats
+
+def json_to_numpy():
+    """Exact-search index for VECTOR_BACKEND=numpy (same docs and embeddings as the Chroma index)."""
+    docs = load_program_docs()
+    vectors = _embeddings().embed_documents([d.page_content for d in docs])
+    write_index(NPINDEX_DIR, vectors, [d.metadata["id"] for d in docs])
+    print(f"✅ NumPy index ready → {len(docs)} rows, dir='{NPINDEX_DIR}'")
+
+def chroma_to_numpy():
+    """Export the existing Chroma collection to NPINDEX_DIR without calling the embeddings API."""
+    got = Chroma(collection_name=COLLECTION, persist_directory=PERSIST_DIR)._collection.get(
+        include=["embeddings", "metadatas"])
+    ids = [(m or {}).get("id") or i for m, i in zip(got["metadatas"], got["ids"])]
+    write_index(NPINDEX_DIR, got["embeddings"], ids)
+    print(f"✅ NumPy index exported from Chroma → {len(ids)} rows, dir='{NPINDEX_DIR}'")
+
+def backfill_index_metadata():
+    """
+    Add the derived metadata (filter flags, program cards) to an existing Chroma collection
+    without re-embedding. The NumPy and BM25 indexes store ids only and read these from the catalog.
+    """
+    def flags_for(md):
+        fp = OUT_DIR / f"{md.get('id')}.json"
+        return index_extras(json.loads(fp.read_text(encoding="utf-8"))) if fp.exists() else {}
+
+    col = Chroma(collection_name=COLLECTION, persist_directory=PERSIST_DIR)._collection
+    got = col.get(include=["metadatas"])
+    col.update(ids=got["ids"], metadatas=[{**(m or {}), **flags_for(m or {})} for m in got["metadatas"]])
+    print(f"✅ Derived metadata added to {len(got['ids'])} Chroma docs")
+
+def json_to_lexical():
+    """BM25 index over the same index_text, for RETRIEVAL_MODE=hybrid (no API calls)."""
+    docs = load_program_docs()
+    BM25Index.build(docs).save(LEXICAL_INDEX_PATH)
+    print(f"✅ BM25 index ready → {len(docs)} docs, path='{LEXICAL_INDEX_PATH}'")
+
+def json_to_catalog():
+    """Consolidated catalog file (CATALOG_PATH) that serving processes load instead of the JSON files."""
+    catalog = ProgramCatalog.from_json_dir(str(OUT_DIR))
+    catalog.save(CATALOG_PATH)
+    print(f"✅ Program catalog ready → {len(catalog)} programs, version {catalog.version}, path='{CATALOG_PATH}'")
+
+def build(force: bool = False, workers: int = EXTRACT_WORKERS) -> None:
+    """
+    Incremental end-to-end build; a no-change run only hashes files and reads the collection.
+    The Chroma sync compares stored metadata too, so records missing derived fields (filter
+    flags, program cards) are re-added with them; vectors are reused, not re-embedded.
+    """
+    t0 = time.perf_counter()
+    changed = md_to_json(force=force, workers=workers)
+    if force or changed["extracted"] or changed["removed"] or not pathlib.Path(CATALOG_PATH).exists():
+        json_to_catalog()
+    synced = json_to_chroma()
+    derived_missing = not index_exists(NPINDEX_DIR) or not pathlib.Path(LEXICAL_INDEX_PATH).exists()
+    if force or derived_missing or synced["embedded"] or synced["reused"] or synced["deleted"]:
+        chroma_to_numpy()          # vectors come from the synced collection, no re-embedding
+        json_to_lexical()
+    print(f"Build finished in {time.perf_counter() - t0:.1f}s")
 
 if __name__ == "__main__":
-    md_to_json()
-    json_to_chroma()
+    ap = argparse.ArgumentParser(description="Build data/programs/*.json and the program indexes from data/*.md")
+    ap.add_argument("--force", action="store_true", help="re-extract every Markdown file")
+    ap.add_argument("--workers", type=int, default=EXTRACT_WORKERS, help="parallel extraction calls")
+    ap.add_argument("--backfill-metadata", action="store_true",
+                    help="only add the derived metadata (filter flags, program cards) to the existing Chroma collection")
+    args = ap.parse_args()
+    if args.backfill_metadata:
+        backfill_index_metadata()
+    else:
+        build(force=args.force, workers=args.workers)
@@ -0,0 +1,135 @@
+# matcher/cache.py
+"""
+Persistent cache for LLM scoring evaluations.
+
+Entries live in a local SQLite file and are keyed on everything that can change
+an evaluation: the scoring-relevant project fields, the program id + content
+hash, the model, the seed and a hash of the prompts. Editing SYSTEM_PROMPT or
+USER_PROMPT_TEMPLATE changes the prompt version, so old entries stop matching
+and age out through the TTL / size bound.
+"""
+from __future__ import annotations
+import hashlib, json, sqlite3, threading, time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .config import (SCORE_CACHE_ENABLED, SCORE_CACHE_PATH,
+                     SCORE_CACHE_TTL, SCORE_CACHE_MAX_ENTRIES)
+from .prompts import SYSTEM_PROMPT, USER_PROMPT_TEMPLATE
+
+# every project field that reaches the scoring prompt; the name is included
+# because the model may quote it in reasons/improvements
+PROJECT_SCORING_FIELDS = ("name", "description", "sectors", "stage", "funding_need", "goals")
+
+
+def _sha(obj: Any) -> str:
+    raw = obj if isinstance(obj, str) else json.dumps(obj, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def prompt_version(*templates: str) -> str:
+    return _sha("\x00".join(templates or (SYSTEM_PROMPT, USER_PROMPT_TEMPLATE)))[:16]
+
+def project_fingerprint(project: Dict[str, Any]) -> str:
+    return _sha({k: project.get(k) for k in PROJECT_SCORING_FIELDS})
+
+def score_key(project: Dict[str, Any], program_id: str, program_text: str,
+              model: str, seed: int, version: str) -> str:
+    return _sha({
+        "project": project_fingerprint(project),
+        "program_id": program_id,
+        "program": _sha(program_text),
+        "model": model,
+        "seed": seed,
+        "prompt": version,
+    })
+
+
+class ScoreCache:
+    """SQLite-backed key -> JSON store with TTL and LRU-by-access size bound."""
+
+    def __init__(self, path: str = SCORE_CACHE_PATH,
+                 ttl_seconds: float = SCORE_CACHE_TTL,
+                 max_entries: int = SCORE_CACHE_MAX_ENTRIES,
+                 version: Optional[str] = None):
+        self.path = path
+        self.ttl = float(ttl_seconds)
+        self.max_entries = int(max_entries)
+        self.version = version or prompt_version()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS scores_accessed ON scores(accessed_at)")
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, created_at FROM scores WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl > 0 and now - row[1] > self.ttl):
+                if row is not None:
+                    self._db.execute("DELETE FROM scores WHERE key = ?", (key,))
+                    self._db.commit()
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE scores SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO scores(key, value, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        if self.ttl > 0:
+            self._db.execute("DELETE FROM scores WHERE created_at < ?", (time.time() - self.ttl,))
+        (n,) = self._db.execute("SELECT COUNT(*) FROM scores").fetchone()
+        if self.max_entries > 0 and n > self.max_entries:
+            self._db.execute(
+                "DELETE FROM scores WHERE key IN"
+                " (SELECT key FROM scores ORDER BY accessed_at ASC LIMIT ?)",
+                (n - self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM scores")
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (n,) = self._db.execute("SELECT COUNT(*) FROM scores").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": n,
+                "prompt_version": self.version, "path": self.path}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_score_cache: Optional[ScoreCache] = None
+_score_cache_lock = threading.Lock()
+
+def get_score_cache() -> Optional[ScoreCache]:
+    """Process-wide cache instance, or None when SCORE_CACHE is disabled."""
+    global _score_cache
+    if not SCORE_CACHE_ENABLED:
+        return None
+    with _score_cache_lock:
+        if _score_cache is None:
+            _score_cache = ScoreCache()
+        return _score_cache
@@ -0,0 +1,69 @@
+# matcher/cards.py
+"""
+Precomputed program cards: the compact program text the scoring prompts see.
+
+A card is built once per program at index time from the full
+data/programs/{id}.json record (list fields included, which Chroma metadata
+cannot hold) and stored as the scalar `program_card` metadata field.
+Fields are added in priority order and long ones are cut so every card stays
+under PROGRAM_CARD_TOKENS; scoring._program_text returns it as is.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List
+
+from .config import PROGRAM_CARD_TOKENS
+from .tokens import count_tokens
+
+# (label, record keys, max list items, max tokens); order = priority when the budget is tight
+CARD_FIELDS = (
+    ("name", ("name", "program_name", "title"), None, 40),
+    ("sectors", ("sector_tags",), 8, 40),
+    ("stages", ("stage_tags",), 7, 30),
+    ("description", ("description",), None, 90),
+    ("goals", ("goals",), 6, 70),
+    ("eligibility_must", ("eligibility_must",), 6, 70),
+    ("objectives", ("objectives", "objectives_text"), None, 60),
+    ("features", ("features",), 6, 50),
+    ("url", ("url", "source_url"), None, 30),
+)
+CARD_ORDER = ("name", "description", "objectives", "goals", "features", "eligibility_must", "sectors", "stages", "url")
+
+
+def _value(record: Dict[str, Any], keys, limit) -> str:
+    for k in keys:
+        v = record.get(k)
+        if isinstance(v, list):
+            items = [str(x).strip() for x in v if str(x).strip()][:limit]
+            if items:
+                return ", ".join(items)
+        elif v not in (None, ""):
+            return str(v).strip()
+    return ""
+
+def _cut(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:   # longest prefix that fits
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid] + "…") <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo].rstrip() + "…" if lo else ""
+
+def build_program_card(record: Dict[str, Any], max_tokens: int = PROGRAM_CARD_TOKENS) -> str:
+    lines: Dict[str, str] = {}
+    left = max_tokens
+    for label, keys, limit, cap in CARD_FIELDS:
+        value = _value(record, keys, limit)
+        if not value:
+            continue
+        line = _cut(f"{label}: {value}", min(cap, left))
+        if not line:
+            break
+        lines[label] = line
+        left -= count_tokens(line) + 1
+    return "\n".join(lines[label] for label in CARD_ORDER if label in lines)
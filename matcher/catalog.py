@@ -0,0 +1,205 @@
+# matcher/catalog.py
+"""
+Program catalog: every program record keyed by program id, held in memory.
+
+Vector and BM25 search only return (program id, distance) pairs; the catalog
+supplies the records. It is loaded once from data/programs/*.json (DATA_PATH),
+or from the consolidated pickle at CATALOG_PATH when that file is at least as
+new as the JSON. Unlike Chroma metadata, records keep their list fields
+(goals, sector_tags, ...). They also carry the index-time derived fields
+(pre-filter flags, program_card).
+
+The store is read-only (MappingProxyType, lists frozen to tuples), so readers
+share it without locking. get_catalog() looks for changes on disk at most
+every CATALOG_RELOAD_SECONDS. A changed catalog is loaded off to the side and
+swapped in with one reference assignment.
+"""
+from __future__ import annotations
+import hashlib, json, logging, os, pickle, tempfile, threading, time
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from .cards import build_program_card
+from .config import DATA_PATH, CATALOG_PATH, CATALOG_RELOAD_SECONDS
+from .filters import program_filter_flags
+
+log = logging.getLogger(__name__)
+
+CATALOG_FORMAT = 2     # bumped when index_extras changes, so older catalog files are rebuilt from the JSON
+
+
+def index_text(p: Dict[str, Any]) -> str:
+    """The text that is embedded and BM25-indexed for a program."""
+    return "\n".join([
+        p.get("name","") or "",
+        p.get("description","") or "",
+        p.get("objectives","") or p.get("objectives_text","") or "",
+        "Goals "       + ", ".join(p.get("goals", []) or []),
+        "Features "    + ", ".join(p.get("features", []) or []),
+        "Eligibility " + ", ".join(p.get("eligibility_must", []) or []),
+        "Sectors "     + ", ".join(p.get("sector_tags", []) or []),
+        "Stages "      + ", ".join(p.get("stage_tags", []) or []),
+    ]).strip()
+
+def index_extras(p: Dict[str, Any]) -> Dict[str, Any]:
+    """Scalar metadata derived from the full record: pre-filter flags and the scoring card."""
+    return {**program_filter_flags(p), "program_card": build_program_card(p)}
+
+def _freeze(v: Any) -> Any:
+    if isinstance(v, list):
+        return tuple(_freeze(x) for x in v)
+    if isinstance(v, dict):
+        return MappingProxyType({k: _freeze(x) for k, x in v.items()})
+    return v
+
+
+class ProgramCatalog:
+    def __init__(self, records: Mapping[str, Dict[str, Any]], texts: Mapping[str, str], version: str):
+        self._records = MappingProxyType({pid: _freeze(dict(r)) for pid, r in records.items()})
+        self._texts = MappingProxyType(dict(texts))
+        self.version = version
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> "ProgramCatalog":
+        entries: Dict[str, Dict[str, Any]] = {}
+        texts: Dict[str, str] = {}
+        digest = hashlib.sha256()
+        for p in sorted(records, key=lambda r: str(r.get("id"))):
+            pid = str(p.get("id") or "")
+            if not pid:
+                continue
+            entries[pid] = {**p, **index_extras(p)}
+            texts[pid] = index_text(p)
+            digest.update(json.dumps(p, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+        return cls(entries, texts, digest.hexdigest()[:16])
+
+    @classmethod
+    def from_json_dir(cls, path: str = DATA_PATH) -> "ProgramCatalog":
+        files = sorted(Path(path).glob("*.json"))
+        return cls.from_records(json.loads(fp.read_text(encoding="utf-8")) for fp in files)
+
+    @classmethod
+    def load(cls, path: str = CATALOG_PATH) -> "ProgramCatalog":
+        with open(path, "rb") as f:
+            raw = pickle.load(f)
+        if raw.get("format") != CATALOG_FORMAT:
+            raise ValueError(f"unsupported catalog format {raw.get('format')!r} in {path}")
+        return cls(raw["records"], raw["texts"], raw["version"])
+
+    def save(self, path: str = CATALOG_PATH) -> None:
+        """One pickle holding every record; swapped in atomically."""
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        raw = {"format": CATALOG_FORMAT, "version": self.version,
+               "records": {pid: self.record(pid) for pid in self._records}, "texts": dict(self._texts)}
+        fd, tmp = tempfile.mkstemp(dir=p.parent, suffix=".pkl")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(raw, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, p)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, pid: object) -> bool:
+        return pid in self._records
+
+    def ids(self) -> List[str]:
+        return list(self._records)
+
+    def get(self, pid: Any) -> Optional[Mapping[str, Any]]:
+        """Read-only record, or None for an unknown id."""
+        return self._records.get(str(pid)) if pid is not None else None
+
+    def record(self, pid: Any) -> Dict[str, Any]:
+        """Mutable copy of a record with plain lists (empty for an unknown id)."""
+        r = self.get(pid)
+        if r is None:
+            return {}
+        return {k: list(v) if isinstance(v, tuple) else v for k, v in r.items()}
+
+    def document(self, pid: Any) -> Optional[Document]:
+        """The program as the Document retrieval hands to scoring (full record as metadata)."""
+        if self.get(pid) is None:
+            return None
+        return Document(page_content=self._texts.get(str(pid), ""), metadata=self.record(pid), id=str(pid))
+
+    def hydrate(self, hits: Iterable[Tuple[Any, float]]) -> List[Tuple[Document, float]]:
+        """(program id, score) pairs -> (Document, score); ids missing from the catalog are dropped."""
+        out = []
+        for pid, score in hits:
+            doc = self.document(pid)
+            if doc is None:
+                log.warning("program %r is in the index but not in the catalog", pid)
+                continue
+            out.append((doc, score))
+        return out
+
+
+def program_id(doc: Any) -> Optional[str]:
+    md = getattr(doc, "metadata", None) or {}
+    pid = md.get("id") or md.get("program_id")
+    return str(pid) if pid else None
+
+def program_record(doc: Any) -> Dict[str, Any]:
+    """Full record for a retrieved doc: the catalog entry, with the doc's own non-empty metadata on top."""
+    md = dict(getattr(doc, "metadata", None) or {})
+    return {**get_catalog().record(program_id(doc)), **{k: v for k, v in md.items() if v not in (None, "")}}
+
+
+# -------------------------
+# process-wide catalog + hot reload
+# -------------------------
+
+def _json_files() -> List[Path]:
+    return sorted(Path(DATA_PATH).glob("*.json"))
+
+def _signature() -> Tuple:
+    files = [(fp.name, fp.stat().st_mtime_ns, fp.stat().st_size) for fp in _json_files()]
+    binary = Path(CATALOG_PATH)
+    b = (binary.stat().st_mtime_ns, binary.stat().st_size) if binary.exists() else None
+    return (tuple(files), b)
+
+def _load_from_disk(sig: Tuple) -> ProgramCatalog:
+    files, binary = sig
+    newest_json = max((m for _, m, _ in files), default=0)
+    if binary is not None and binary[0] >= newest_json:
+        try:
+            cat = ProgramCatalog.load(CATALOG_PATH)
+            if set(cat.ids()) == {Path(name).stem for name, _, _ in files}:
+                return cat
+            log.info("catalog file %s does not match %s; loading the JSON", CATALOG_PATH, DATA_PATH)
+        except Exception as e:
+            log.warning("catalog file %s unreadable (%s); loading %s", CATALOG_PATH, e, DATA_PATH)
+    return ProgramCatalog.from_json_dir(DATA_PATH)
+
+_catalog: Optional[ProgramCatalog] = None
+_catalog_sig: Optional[Tuple] = None
+_checked_at = 0.0
+_catalog_lock = threading.Lock()
+
+def reload_catalog(force: bool = True) -> ProgramCatalog:
+    """Load the catalog again (force) or only if its files changed, then swap it in."""
+    global _catalog, _catalog_sig, _checked_at
+    with _catalog_lock:
+        sig = _signature()
+        _checked_at = time.monotonic()
+        if not force and _catalog is not None and sig == _catalog_sig:
+            return _catalog
+        fresh = _load_from_disk(sig)
+        if _catalog is not None:
+            log.info("program catalog reloaded: %d programs, version %s -> %s",
+                     len(fresh), _catalog.version, fresh.version)
+        _catalog, _catalog_sig = fresh, sig
+        return fresh
+
+def get_catalog() -> ProgramCatalog:
+    cat = _catalog
+    if cat is None:
+        return reload_catalog(force=False)
+    if CATALOG_RELOAD_SECONDS > 0 and time.monotonic() - _checked_at >= CATALOG_RELOAD_SECONDS:
+        return reload_catalog(force=False)
+    return cat
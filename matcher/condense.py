@@ -0,0 +1,127 @@
+# matcher/condense.py
+"""
+Token-budgeted condensation of program Markdown before LLM extraction.
+
+1. clean: drop exact / normalized duplicate lines, "step — step" echoes, bullets
+   that only repeat their heading, and site boilerplate (nav, share, copyright).
+2. budget: if the page is still over `budget * max_chunks` tokens, whole sections
+   are dropped lowest-priority first (FAQ, partners, statistics, ...), then the
+   remaining low-priority sections are cut line by line.
+3. split: a page over `budget` is cut into section-aligned chunks of at most
+   `budget` tokens, each carrying the title block, for map-reduce extraction
+   (see extractor.extract_with_report).
+"""
+from __future__ import annotations
+import os, re
+from typing import List, Tuple
+
+from .arabic import normalize_ar
+from .tokens import count_tokens
+
+EXTRACT_TOKEN_BUDGET = int(os.getenv("EXTRACT_TOKEN_BUDGET", "3000"))   # per LLM call
+EXTRACT_MAX_CHUNKS = int(os.getenv("EXTRACT_MAX_CHUNKS", "4"))          # map-reduce fan-out cap
+
+_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+(?P<txt>.+)$")
+_BOILERPLATE = re.compile(
+    r"جميع الحقوق محفوظة|حقوق النشر|تابعونا|تابعنا على|شارك هذه الصفحة|مشاركة الصفحة|"
+    r"هل كانت هذه الصفحة مفيدة|تسجيل الدخول|القائمة الرئيسية|انتقل إلى المحتوى|"
+    r"^(?:الرئيسية|طباعة|مشاركة|عودة)$|cookie|©"
+)
+_ECHO = re.compile(r"^(?P<lead>\s*(?:[-*•]\s+)*)(?P<a>.+?)\s+—\s+(?P<b>.+)$")
+# heading keyword -> priority (higher is kept first); unknown sections sit at 2
+SECTION_PRIORITY: Tuple[Tuple[str, int], ...] = (
+    ("الوصف", 9), ("الأهداف", 8), ("أهداف", 8), ("المميزات", 7), ("المزايا", 7), ("الخدمات", 6),
+    ("خدمات", 6), ("متطلبات", 6), ("شروط", 6), ("معايير", 6), ("الفئة المستفيدة", 6),
+    ("تاريخ", 5), ("الأثر", 4), ("مخرجات", 4), ("خطوات", 3), ("الخطوات", 3),
+    ("قنوات", 1), ("اللغة", 1), ("الأسئلة الشائعة", 0), ("الشركاء", 0), ("شركاء", 0),
+    ("إحصائيات", 0), ("الفيديو", 0),
+)
+_PRIORITY = [(normalize_ar(k), p) for k, p in SECTION_PRIORITY]
+
+
+def section_priority(heading: str) -> int:
+    key = normalize_ar(heading)
+    return max((p for k, p in _PRIORITY if k in key), default=2)
+
+def clean_markdown(md: str) -> str:
+    out: List[str] = []
+    seen = set()
+    heading = ""
+    for raw in md.splitlines():
+        line = raw.rstrip()
+        m = _ECHO.match(line)
+        if m and (m.group("a").strip() == m.group("b").strip() or m.group("a").strip().startswith(m.group("b").strip())):
+            line = m.group("lead") + m.group("a").strip()
+        h = _HEADING.match(line)
+        if h:
+            heading = normalize_ar(h.group("txt"))
+        body = normalize_ar(re.sub(r"^\s*(?:[-*•]\s+)+", "", line))
+        if not line.strip():
+            if out and out[-1] != "":
+                out.append("")
+            continue
+        if _BOILERPLATE.search(line) or (not h and body == heading):
+            continue
+        if not h and body in seen:
+            continue
+        seen.add(body)
+        out.append(line)
+    return "\n".join(out).strip() + "\n"
+
+def _sections(md: str) -> Tuple[str, List[Tuple[str, List[str]]]]:
+    """(head block before the first ## heading, [(heading line, body lines)])."""
+    head: List[str] = []
+    sections: List[Tuple[str, List[str]]] = []
+    for line in md.splitlines():
+        h = _HEADING.match(line)
+        if h and not line.lstrip().startswith("# "):
+            sections.append((line, []))
+        elif sections:
+            sections[-1][1].append(line)
+        else:
+            head.append(line)
+    return "\n".join(head).strip(), sections
+
+def _render(head: str, sections: List[Tuple[str, List[str]]]) -> str:
+    parts = [head] + ["\n".join([h, *body]).strip() for h, body in sections]
+    return "\n\n".join(p for p in parts if p) + "\n"
+
+def trim_to_budget(md: str, budget: int) -> str:
+    """Drop / cut the lowest-priority sections until the page fits `budget` tokens."""
+    if count_tokens(md) <= budget:
+        return md
+    head, sections = _sections(md)
+    order = sorted(range(len(sections)), key=lambda i: (section_priority(sections[i][0]), -i))
+    keep = {i: list(body) for i, (_, body) in enumerate(sections)}
+    for i in order:
+        if count_tokens(_render(head, [(sections[j][0], keep[j]) for j in sorted(keep)])) <= budget:
+            break
+        while keep[i] and count_tokens(_render(head, [(sections[j][0], keep[j]) for j in sorted(keep)])) > budget:
+            keep[i].pop()
+        if not keep[i]:
+            del keep[i]
+    return _render(head, [(sections[j][0], keep[j]) for j in sorted(keep)])
+
+def split_for_extraction(md: str, budget: int) -> List[str]:
+    """Section-aligned chunks of at most ~budget tokens, each starting with the title block."""
+    if count_tokens(md) <= budget:
+        return [md]
+    head, sections = _sections(md)
+    chunks: List[List[Tuple[str, List[str]]]] = [[]]
+    for sec in sections:
+        if chunks[-1] and count_tokens(_render(head, chunks[-1] + [sec])) > budget:
+            chunks.append([])
+        chunks[-1].append(sec)
+    return [_render(head, c) for c in chunks if c]
+
+def condense(md: str, budget: int = EXTRACT_TOKEN_BUDGET, max_chunks: int = EXTRACT_MAX_CHUNKS) -> List[str]:
+    """clean -> trim to budget * max_chunks -> split into <= budget chunks (usually one)."""
+    cleaned = clean_markdown(md)
+    max_chunks = max(1, max_chunks)
+    total = budget * max_chunks
+    while True:
+        # every chunk repeats the title block, so the split can need more chunks than total / budget
+        chunks = split_for_extraction(trim_to_budget(cleaned, total), budget)
+        if len(chunks) <= max_chunks or total <= budget:
+            return chunks[:max_chunks]
+        total = int(total * 0.85)
@@ -18,9 +18,80 @@ MATCH_TABLE    = os.getenv("MATCH_TABLE", "match_results")
 TOP_K_DEFAULT = int(os.getenv("TOP_K_DEFAULT", "10"))
 SEED_DEFAULT  = int(os.getenv("SEED_DEFAULT", "42"))
 
+# program catalog (matcher/catalog.py): consolidated copy of DATA_PATH written by the index build,
+# and how often (seconds) a running process checks the files for changes; 0 = never
+CATALOG_PATH = os.getenv("CATALOG_PATH") or str(ROOT / "np_index" / "catalog.pkl")
+CATALOG_RELOAD_SECONDS = float(os.getenv("CATALOG_RELOAD_SECONDS", "30"))
+
+# retrieval backend: "chroma" (PERSIST_DIR) or "numpy" (exact search over NPINDEX_DIR, see matcher/npindex.py)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+NPINDEX_DIR = os.getenv("NPINDEX_DIR") or str(ROOT / "np_index")
+
+# candidate retrieval: "dense" (vector search only) or "hybrid" (dense + BM25 over
+# LEXICAL_INDEX_PATH, merged by reciprocal-rank fusion, see matcher/retrieval.py)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "10"))       # candidates retrieved per match (at least top_k)
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH") or str(ROOT / "np_index" / "bm25.json")
+RRF_K = int(os.getenv("RRF_K", "60"))
+HYBRID_POOL_FACTOR = float(os.getenv("HYBRID_POOL_FACTOR", "2"))  # each list is searched to ceil(factor * k)
+
+# metadata pre-filters pushed into the vector search (see matcher/filters.py);
+# each rule is "hard" | "soft" (relaxed when fewer than k programs pass) | "off"
+FILTER_STAGE = os.getenv("FILTER_STAGE", "soft")
+FILTER_STAGE_WINDOW = int(os.getenv("FILTER_STAGE_WINDOW", "1"))  # ladder steps either side of the project stage
+FILTER_FUNDING = os.getenv("FILTER_FUNDING", "soft")              # funding_max >= need, or in-kind (0)
+FILTER_PROGRAM_TYPE = os.getenv("FILTER_PROGRAM_TYPE", "hard")
+FILTER_PROGRAM_TYPES = tuple(t.strip() for t in os.getenv("FILTER_PROGRAM_TYPES", "").split(",") if t.strip())
+
+# max in-flight LLM scoring calls per match run (1 = sequential)
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "5"))
+
+# "llm"     = one prompt per candidate
+# "batch"   = SCORING_BATCH_SIZE programs per prompt
+# "two_phase" = numeric-only prompt per candidate, reasons/improvements only for the persisted top-k
+# "hybrid"  = local rule engine for sector/stage/funding, LLM for goal + reasons
+# "offline" = local rule engine only, no LLM calls
+SCORING_MODE = os.getenv("SCORING_MODE", "llm")
+SCORING_BATCH_SIZE = int(os.getenv("SCORING_BATCH_SIZE", "5"))
+
+# llm/hybrid modes: stop LLM calls once no remaining candidate's score upper
+# bound can beat the current k-th best (ANYTIME_WAVE candidates per round).
+# Off by default: relative calibration is then fit on the evaluated subset only,
+# so persisted final_cal values differ from a full run.
+EARLY_STOP = os.getenv("EARLY_STOP", "0") not in ("", "0", "false", "False")
+ANYTIME_WAVE = int(os.getenv("ANYTIME_WAVE", "1"))
+
+# two-stage cascade: only the best candidates by cheap score (rules + content)
+# reach the LLM: CASCADE_KEEP if set, else ceil(CASCADE_FACTOR * top_k).
+# Off by default: it can drop a program the LLM would have ranked in the top-k.
+CASCADE_ENABLED = os.getenv("CASCADE", "0") not in ("", "0", "false", "False")
+CASCADE_KEEP = int(os.getenv("CASCADE_KEEP", "0"))
+CASCADE_FACTOR = float(os.getenv("CASCADE_FACTOR", "1.5"))
+
+# persistent LLM evaluation cache (see matcher/cache.py)
+SCORE_CACHE_ENABLED = os.getenv("SCORE_CACHE", "1") not in ("", "0", "false", "False")
+SCORE_CACHE_PATH = os.getenv("SCORE_CACHE_PATH") or str(ROOT / ".cache" / "scores.sqlite3")
+SCORE_CACHE_TTL = float(os.getenv("SCORE_CACHE_TTL", str(7 * 24 * 3600)))  # seconds; 0 = never expire
+SCORE_CACHE_MAX_ENTRIES = int(os.getenv("SCORE_CACHE_MAX_ENTRIES", "5000"))
+
+# content-addressed embedding cache (see matcher/embed_cache.py)
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE", "1") not in ("", "0", "false", "False")
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH") or str(ROOT / ".cache" / "embeddings.sqlite3")
+EMBED_CACHE_MEMORY = int(os.getenv("EMBED_CACHE_MEMORY", "1024"))        # in-process LRU entries
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "50000"))
+
+# token bound of the precomputed program card sent to the scoring prompts (see matcher/cards.py)
+PROGRAM_CARD_TOKENS = int(os.getenv("PROGRAM_CARD_TOKENS", "350"))
+
 # DO NOT CHANGE (per your scoring spec)
 WEIGHTS = (0.45, 0.35, 0.20)
 
 CALIBRATION = os.getenv("CALIBRATION", "relative_minmax")
 if CALIBRATION == "":
     CALIBRATION = None
+
+# background match jobs (see matcher/jobs.py)
+MATCH_JOBS_DB = os.getenv("MATCH_JOBS_DB") or str(ROOT / ".cache" / "match_jobs.sqlite3")
+MATCH_WORKERS = int(os.getenv("MATCH_WORKERS", "2"))
+MATCH_JOB_MAX_ATTEMPTS = int(os.getenv("MATCH_JOB_MAX_ATTEMPTS", "3"))  # runs before a job left running is failed
+MATCH_JOB_LEASE_SECONDS = float(os.getenv("MATCH_JOB_LEASE_SECONDS", "60"))  # renewed every third of this while running
@@ -0,0 +1,181 @@
+# matcher/embed_cache.py
+"""
+Content-addressed cache for embedding vectors.
+
+A vector only depends on the embedding model and the text, so entries are keyed
+on sha256(model, normalized text) and never go stale. Lookups go through a
+small in-process LRU first, then a local SQLite file that stores each vector as
+a float32 blob (6 KB for text-embedding-3-small). Misses are embedded in one
+call and written back.
+
+`CachedEmbeddings` wraps any LangChain `Embeddings`, so it can be handed to
+Chroma both at query time (matcher.vectorstore) and at index build time
+(build_md_json_index), where unchanged documents are not re-embedded.
+"""
+from __future__ import annotations
+import hashlib, re, sqlite3, threading, time, unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .config import (EMBED_CACHE_ENABLED, EMBED_CACHE_PATH,
+                     EMBED_CACHE_MEMORY, EMBED_CACHE_MAX_ENTRIES)
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    return _WS.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+def embedding_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """In-memory LRU in front of a SQLite key -> float32 blob store."""
+
+    def __init__(self, path: str = EMBED_CACHE_PATH,
+                 memory_entries: int = EMBED_CACHE_MEMORY,
+                 max_entries: int = EMBED_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.memory_entries = int(memory_entries)
+        self.max_entries = int(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._mem: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vec BLOB NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings(accessed_at)")
+        self._db.commit()
+
+    def _remember(self, key: str, vec: np.ndarray) -> None:
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.memory_entries:
+            self._mem.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            disk = []
+            for k in keys:
+                if k in self._mem:
+                    self._mem.move_to_end(k)
+                    found[k] = self._mem[k]
+                else:
+                    disk.append(k)
+            if disk:
+                marks = ",".join("?" * len(disk))
+                rows = self._db.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({marks})", disk
+                ).fetchall()
+                for k, blob in rows:
+                    vec = np.frombuffer(blob, dtype=np.float32)
+                    found[k] = vec
+                    self._remember(k, vec)
+                if rows:
+                    self._db.execute(
+                        f"UPDATE embeddings SET accessed_at = ? WHERE key IN ({marks})",
+                        [time.time(), *disk],
+                    )
+                    self._db.commit()
+            hit = sum(1 for k in keys if k in found)
+            self.hits += hit
+            self.misses += len(keys) - hit
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            rows = []
+            for k, vec in items.items():
+                vec = np.asarray(vec, dtype=np.float32)
+                self._remember(k, vec)
+                rows.append((k, int(vec.shape[0]), vec.tobytes(), now))
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings(key, dim, vec, accessed_at) VALUES (?, ?, ?, ?)", rows
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        (n,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if self.max_entries > 0 and n > self.max_entries:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE key IN"
+                " (SELECT key FROM embeddings ORDER BY accessed_at ASC LIMIT ?)",
+                (n - self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            self._db.execute("DELETE FROM embeddings")
+            self._db.commit()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            (n,) = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": n,
+                "memory_entries": len(self._mem), "path": self.path}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends cache misses to the underlying client."""
+
+    def __init__(self, inner: Embeddings, model: str, cache: Optional[EmbeddingCache] = None):
+        self.inner = inner
+        self.model = model
+        self.cache = cache or get_embedding_cache()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_key(self.model, t) for t in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+        todo: Dict[str, str] = {}
+        for k, t in zip(keys, texts):
+            if k not in found and k not in todo:
+                todo[k] = t
+        if todo:
+            vecs = self.inner.embed_documents(list(todo.values()))
+            fresh = {k: np.asarray(v, dtype=np.float32) for k, v in zip(todo, vecs)}
+            self.cache.put_many(fresh)
+            found.update(fresh)
+        return [found[k].tolist() for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        k = embedding_key(self.model, text)
+        hit = self.cache.get_many([k]).get(k)
+        if hit is None:
+            hit = np.asarray(self.inner.embed_query(text), dtype=np.float32)
+            self.cache.put_many({k: hit})
+        return hit.tolist()
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache()
+        return _embedding_cache
+
+def cached_embeddings(inner: Embeddings, model: str) -> Embeddings:
+    """Wrap `inner` with the process-wide cache, or return it as-is when EMBED_CACHE is off."""
+    return CachedEmbeddings(inner, model) if EMBED_CACHE_ENABLED else inner
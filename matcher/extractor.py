@@ -1,10 +1,13 @@
 # extractor.py
 from __future__ import annotations
-import re, json, unicodedata
-from typing import List, Optional, Dict, Any
+import re, json, os, unicodedata, threading
+from typing import Callable, List, Optional, Dict, Any, Tuple
 from pydantic import BaseModel, Field
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
+from .arabic import normalize_ar, tokens_ar
+from .rules import SECTOR_SYNONYMS, GENERIC_SECTOR_TAGS
+from .condense import condense
 
 # ---------------- Program schema (matches your downstream keys) ----------------
 class ProgramSchema(BaseModel):
@@ -98,27 +101,29 @@ def _dedup_keep_order(items: List[str]) -> List[str]:
             out.append(key); seen.add(key)
     return out
 
-def _fallback_enrich(data: Dict[str, Any], md: str) -> Dict[str, Any]:
+def _fallback_enrich(data: Dict[str, Any], md: str, parsed: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    parsed = parsed or parse_markdown(md)   # one scan of the text for every heuristic below
+    field_lines = parsed["field_lines"]
     # name
     if not data.get("name"):
-        data["name"] = _first_heading(md) or "برنامج"
+        data["name"] = parsed["title"] or "برنامج"
     # description
     if not data.get("description"):
-        data["description"] = _first_paragraph(md)
+        data["description"] = parsed["first_paragraph"]
     # url
     if not data.get("url"):
-        data["url"] = _first_url(md)
+        data["url"] = parsed["url"]
 
     # goals: prefer bullets or "Goals:" lines
     if not data.get("goals"):
-        bullets = _collect_bullets(md) or _collect_field_lines(md)
+        bullets = parsed["bullets"] or field_lines
         data["goals"] = _dedup_keep_order(bullets[:8])  # cap
 
     # features/eligibility: mine from bullets too if empty
     if not data.get("features"):
-        data["features"] = _dedup_keep_order(data.get("features", []) + _collect_field_lines(md))[:8]
+        data["features"] = _dedup_keep_order(data.get("features", []) + field_lines)[:8]
     if not data.get("eligibility_must"):
-        elig_lines = [x for x in _collect_field_lines(md) if "شروط" in x or "Eligible" in x or "الأهلية" in x]
+        elig_lines = [x for x in field_lines if "شروط" in x or "Eligible" in x or "الأهلية" in x]
         data["eligibility_must"] = _dedup_keep_order(elig_lines[:8])
 
     # sector/stage tags: quick heuristics if missing
@@ -152,18 +157,255 @@ def _fallback_enrich(data: Dict[str, Any], md: str) -> Dict[str, Any]:
 
     return data
 
+# ---------------- rule-based fast path ----------------
+# schema list field -> heading keywords; a section goes to the first field with a keyword in its heading
+SECTION_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "goals": ("الأهداف", "أهداف", "الأثر المستهدف"),
+    "features": ("المميزات", "المزايا", "الخدمات", "خدمات", "مخرجات", "فعاليات"),
+    "eligibility_must": ("متطلبات", "معايير", "شروط", "الفئة المستفيدة"),
+}
+DESCRIPTION_HEADINGS = ("الوصف", "نبذة", "عن البرنامج")
+LAUNCH_HEADINGS = ("تاريخ بدء إطلاق الخدمة", "تاريخ الإطلاق")
+AR_MONTHS = {"يناير": 1, "فبراير": 2, "مارس": 3, "ابريل": 4, "أبريل": 4, "مايو": 5, "يونيو": 6,
+             "يوليو": 7, "اغسطس": 8, "أغسطس": 8, "سبتمبر": 9, "اكتوبر": 10, "أكتوبر": 10,
+             "نوفمبر": 11, "ديسمبر": 12}
+STAGE_CUES: Tuple[Tuple[str, str], ...] = (
+    ("فكرة", r"فكرة|أفكار|الطلاب|طلاب"),
+    ("MVP", r"\bMVP\b|نموذج أولي|نماذج العمل الأولية|نموذج تجريبي"),
+    ("إطلاق", r"إطلاق|تدشين|تأسيس|ناشئة|launch"),
+    ("تشغيل", r"تشغيل|تشغيلي|القائمة|production|go[- ]?live"),
+    ("نمو مبكر", r"نمو مبكر|early growth"),
+    ("نمو", r"متسارعة النمو|نمو متسارع"),
+    ("توسع", r"التوسع في الأسواق|توسع"),
+)
+# below this a field is (re)filled by the LLM; override with EXTRACT_LLM_FILL=missing,low
+LLM_FILL_CONFIDENCE = tuple(x.strip() for x in os.getenv("EXTRACT_LLM_FILL", "missing").split(",") if x.strip())
+
+LINK_PAT = re.compile(r"^\[?(?P<url>https?://[^\]\s)]+)")
+UPDATED_PAT = re.compile(r"آخر تحديث[^:]*:\s*(?P<d>\d{4}-\d{2}-\d{2})(?:\s+(?P<t>\d{1,2}:\d{2}))?")
+MONEY_PAT = re.compile(r"\d[\d,\.]*\s*(?:ريال|ر\.س|SAR|مليون|ألف)")
+_MARKERS = re.compile(r"^(?:[-*•▪︎+]\s+)+|\*\*[QA]:\*\*\s*")
+_SECTION_KEYS = [(f, tuple(normalize_ar(k) for k in ks)) for f, ks in SECTION_FIELDS.items()]
+
+
+def _section_field(heading: str) -> Optional[str]:
+    key = normalize_ar(heading)
+    return next((f for f, ks in _SECTION_KEYS if any(k in key for k in ks)), None)
+
+
+def _clean_bullet(txt: str) -> str:
+    txt = _MARKERS.sub("", txt.strip()).strip()
+    # "step — step" rows from the scraper repeat the same text on both sides
+    left, sep, right = txt.partition(" — ")
+    if sep and (left.strip() == right.strip() or left.strip().startswith(right.strip())):
+        txt = left
+    return txt.strip(" -")
+
+def parse_markdown(md: str) -> Dict[str, Any]:
+    """
+    Single pass over the Markdown lines. Returns title, url, updated ("YYYY-MM-DD HH:MM"),
+    sections {heading: [lines]} in document order, plus the flat bullets / field_lines /
+    first_paragraph that _fallback_enrich used to rescan the text for.
+    """
+    out: Dict[str, Any] = {"title": None, "url": None, "updated": None, "sections": {},
+                           "bullets": [], "field_lines": [], "first_paragraph": ""}
+    current: Optional[str] = None
+    para: List[str] = []
+    for raw in md.splitlines():
+        line = raw.strip()
+        h = HEADING_PAT.match(raw)
+        if h:
+            txt = h.group("txt").strip()
+            if out["title"] is None and raw.lstrip().startswith("# "):
+                out["title"] = txt
+            else:
+                current = txt
+                out["sections"].setdefault(current, [])
+            continue
+        if not line:
+            if para and not out["first_paragraph"]:
+                out["first_paragraph"] = " ".join(para)
+            para = []
+            continue
+        if out["url"] is None and (m := LINK_PAT.match(line)):
+            out["url"] = m.group("url")
+            continue
+        if out["updated"] is None and (m := UPDATED_PAT.search(line)):
+            out["updated"] = f"{m.group('d')} {m.group('t') or '00:00'}"
+            continue
+        if m := FIELD_LINE_PAT.match(line):
+            out["field_lines"].append(m.group("txt").strip())
+        is_bullet = BULLET_PAT.match(raw) is not None or line.startswith("- ")
+        text = _clean_bullet(line) if is_bullet else line
+        if is_bullet and text:
+            out["bullets"].append(text)
+        elif current is not None and not out["first_paragraph"]:
+            para.append(line)
+        if current is not None and text and normalize_ar(text) != normalize_ar(current):
+            out["sections"][current].append(text)
+    if para and not out["first_paragraph"]:
+        out["first_paragraph"] = " ".join(para)
+    if not out["first_paragraph"]:
+        out["first_paragraph"] = md.strip()[:400]
+    return out
+
+def _iso_updated(v: Optional[str]) -> Optional[str]:
+    if not v:
+        return None
+    d, _, t = v.partition(" ")
+    return f"{d}T{t or '00:00'}:00"
+
+def _launch_date(lines: List[str]) -> Optional[str]:
+    for line in lines:
+        year = re.search(r"(19|20)\d{2}", line)
+        if not year:
+            continue
+        month = next((n for name, n in AR_MONTHS.items() if name in line), None)
+        return f"{year.group(0)}-{month:02d}" if month else year.group(0)
+    return None
+
+def _sector_tags(text: str) -> List[str]:
+    """Known sector / support phrases found in the text, one spelling per sector (token match, not substring)."""
+    padded = f" {' '.join(tokens_ar(text))} "
+    hit = lambda phrase: f" {' '.join(tokens_ar(phrase))} " in padded
+    tags = [next((s for s in syns if not s.isascii() and hit(s)), None) for syns in SECTOR_SYNONYMS.values()]
+    tags += [g for g in GENERIC_SECTOR_TAGS if hit(g)]
+    seen, out = set(), []
+    for t in tags:
+        key = " ".join(tokens_ar(t)) if t else ""
+        if key and key not in seen:
+            seen.add(key); out.append(t)
+    return out
+
+def rule_extract(md: str, parsed: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Deterministic ProgramSchema from the parsed structure. Returns (data, confidence) where
+    confidence[field] is "high" (read from an explicit heading / line), "medium" (derived by a
+    rule from explicit content), "low" (keyword guess) or "missing".
+    """
+    p = parsed or parse_markdown(md)
+    data: Dict[str, Any] = {}
+    conf: Dict[str, str] = {}
+
+    def put(field: str, value: Any, level: str) -> None:
+        data[field] = value
+        conf[field] = level if value not in (None, "", []) else "missing"
+
+    by_field: Dict[str, List[str]] = {f: [] for f in SECTION_FIELDS}
+    description, launch = [], []
+    for heading, lines in p["sections"].items():
+        key = normalize_ar(heading)
+        field = _section_field(heading)
+        if field:
+            by_field[field].extend(lines)
+        elif key in {normalize_ar(h) for h in DESCRIPTION_HEADINGS}:
+            description.extend(lines)
+        elif key in {normalize_ar(h) for h in LAUNCH_HEADINGS}:
+            launch.extend(lines)
+
+    name = p["title"] or ""
+    put("name", name, "high")
+    put("id", _slug_ar_lat(name) if name else "", "medium")
+    put("description", " ".join(description).strip(), "high")
+    for field, lines in by_field.items():
+        put(field, _dedup_keep_order(lines)[:12], "high")
+    put("url", p["url"], "high")
+    put("last_updated", _iso_updated(p["updated"]), "high")
+    put("launch_date", _launch_date(launch), "high")
+    if not launch:
+        conf["launch_date"] = "absent"   # no launch section: the model could only guess a date
+
+    goals = data.get("goals") or []
+    put("objectives", "؛ ".join(goals[:3]), "medium")
+    put("objectives_text", data["objectives"], "medium")
+    put("program_type", "مبادرة/تمكين" if "مبادرة" in name else "برنامج", "medium" if name else "missing")
+
+    if MONEY_PAT.search(md):
+        # amounts present: the type and range need reading, leave them to the model
+        put("funding_type", None, "missing")
+        conf["funding_min"] = conf["funding_max"] = "missing"
+    else:
+        put("funding_type", "in-kind", "medium")
+        data["funding_min"] = data["funding_max"] = 0.0
+        conf["funding_min"] = conf["funding_max"] = "medium"
+
+    signal = " ".join([name, data["description"], *goals, *data["features"], *data["eligibility_must"]])
+    put("sector_tags", _sector_tags(signal), "low")
+    put("stage_tags", [stage for stage, cue in STAGE_CUES if re.search(cue, signal)], "low")
+    return data, conf
+
 # ---------------- public entrypoint ----------------
-def run(markdown: str, notes: str = "") -> Dict[str, Any]:
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, top_p=1, seed=42)
-    structured_llm = llm.with_structured_output(ProgramSchema)
-    prompt = PROMPT
-    try:
-        resp = structured_llm.invoke(prompt.format_messages(markdown=markdown, notes=notes))
-        data = resp.dict()
-    except Exception:
-        # very rare; return minimal skeleton to be enriched by fallback
-        data = ProgramSchema(id="program", name="برنامج").dict()
+EXTRACT_MODEL = "gpt-4o-mini"
+_structured_llm = None
+_structured_llm_lock = threading.Lock()
+
+def get_structured_llm():
+    """One structured-output client per process; ChatOpenAI is safe to share across threads."""
+    global _structured_llm
+    with _structured_llm_lock:
+        if _structured_llm is None:
+            llm = ChatOpenAI(model=EXTRACT_MODEL, temperature=0, top_p=1, seed=42)
+            _structured_llm = llm.with_structured_output(ProgramSchema)
+        return _structured_llm
+
+def _merge_extractions(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Reduce step for chunked extraction: lists are unioned in order, scalars keep the first value."""
+    merged: Dict[str, Any] = {}
+    for part in parts:
+        for k, v in part.items():
+            if isinstance(v, list):
+                merged[k] = _dedup_keep_order((merged.get(k) or []) + [str(x) for x in v])
+            elif merged.get(k) in (None, "", 0.0) and v not in (None, ""):
+                merged[k] = v
+    amounts = [float(p.get("funding_max") or 0) for p in parts]
+    if any(amounts):
+        merged["funding_max"] = max(amounts)
+        merged["funding_min"] = min((float(p.get("funding_min") or 0) for p in parts if p.get("funding_min")), default=0.0)
+    return merged
+
+def extract_with_report(markdown: str, notes: str = "", raise_errors: bool = False,
+                        before_llm: Optional[Callable[[str], None]] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Rule-based parse first; the LLM is called only when some field's confidence is in
+    LLM_FILL_CONFIDENCE, and only those fields are taken from its answer. The page is
+    condensed to the token budget first (matcher/condense.py); a page that is still too long
+    is extracted chunk by chunk and the answers merged. `before_llm(chunk)` runs right before
+    each call (rate limiting). raise_errors=True lets callers retry LLM failures instead of
+    falling back to the heuristics.
+    Returns (data, report) with report = {"confidence": {field: level}, "llm_fields": [...], "llm_calls": n}.
+    """
+    parsed = parse_markdown(markdown)
+    data, conf = rule_extract(markdown, parsed)
+    fill = [f for f in ProgramSchema.model_fields if f != "source_path" and conf.get(f, "missing") in LLM_FILL_CONFIDENCE]
+
+    llm_fields: List[str] = []
+    calls = 0
+    if fill:
+        hint = "املأ بدقة الحقول التالية: " + ", ".join(fill)
+        try:
+            answers = []
+            for chunk in condense(markdown):
+                if before_llm:
+                    before_llm(chunk)
+                calls += 1
+                resp = get_structured_llm().invoke(PROMPT.format_messages(
+                    markdown=chunk, notes=f"{notes}\n{hint}".strip()))
+                answers.append(resp.dict())
+            llm = _merge_extractions(answers)
+            for f in fill:
+                if llm.get(f) not in (None, "", []):
+                    data[f] = llm[f]
+                    conf[f] = "llm"
+                    llm_fields.append(f)
+        except Exception:
+            if raise_errors:
+                raise
 
     # fallback enrichment for any empty fields
-    data = _fallback_enrich(data, markdown)
-    return data
+    skeleton = ProgramSchema(id="program", name="برنامج").dict()
+    skeleton.update({k: v for k, v in data.items() if v is not None})
+    data = _fallback_enrich(skeleton, markdown, parsed)
+    return data, {"confidence": conf, "llm_fields": llm_fields, "llm_calls": calls}
+
+def run(markdown: str, notes: str = "", raise_errors: bool = False) -> Dict[str, Any]:
+    return extract_with_report(markdown, notes=notes, raise_errors=raise_errors)[0]
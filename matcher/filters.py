@@ -0,0 +1,103 @@
+# matcher/filters.py
+"""
+Metadata pre-filters pushed into the vector search.
+
+Chroma metadata only holds scalars (filter_complex_metadata drops stage_tags and
+the other lists), so the index carries flattened flags written at build time:
+
+    stage_0 .. stage_6   True if the program targets that STAGE_LADDER step
+    has_stage_tags       False for programs that list no stage (never filtered on stage)
+    funding_max          0 means in-kind / unspecified; written as 0 when the record has none
+
+`build_where` turns a project + the FILTER_* config into a Chroma `where`
+clause; `matches_where` evaluates the same clause for the NumPy and BM25
+indexes. Each rule is "hard" (always applied), "soft" (dropped if it leaves
+fewer than k candidates) or "off".
+
+The index build (build_md_json_index.build) writes the flags: the Chroma sync
+re-adds every record whose metadata changed. A collection built before the
+flags existed needs `python -m matcher.build_md_json_index --backfill-metadata`
+(or a build); until then retrieval skips the stage rule and logs a warning.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+
+from .config import (FILTER_STAGE, FILTER_STAGE_WINDOW, FILTER_FUNDING,
+                     FILTER_PROGRAM_TYPE, FILTER_PROGRAM_TYPES)
+from .rules import STAGE_LADDER, normalize_stage, _as_list
+
+
+def program_filter_flags(program: Dict[str, Any]) -> Dict[str, Any]:
+    """Scalar metadata added to every indexed program so the filters survive filter_complex_metadata."""
+    idx = {normalize_stage(s) for s in _as_list(program.get("stage_tags"))} - {None}
+    flags: Dict[str, Any] = {f"stage_{i}": i in idx for i in range(len(STAGE_LADDER))}
+    flags["has_stage_tags"] = bool(idx)
+    # a missing funding_max would fail both branches of the funding rule
+    try:
+        flags["funding_max"] = float(program.get("funding_max") or 0)
+    except (TypeError, ValueError):
+        flags["funding_max"] = 0.0
+    return flags
+
+def _and(clauses: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def _or(clauses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+def _rules(user_project: Dict[str, Any], stage_flags: bool = True) -> List[tuple]:
+    """(level, clause) for every rule that applies to this project."""
+    out = []
+    stage = normalize_stage(user_project.get("stage"))
+    if FILTER_STAGE != "off" and stage is not None and stage_flags:
+        w = max(0, FILTER_STAGE_WINDOW)
+        steps = range(max(0, stage - w), min(len(STAGE_LADDER), stage + w + 1))
+        out.append((FILTER_STAGE, _or([{f"stage_{i}": True} for i in steps] + [{"has_stage_tags": False}])))
+    try:
+        need = float(user_project.get("funding_need") or 0)
+    except (TypeError, ValueError):
+        need = 0.0
+    if FILTER_FUNDING != "off" and need > 0:
+        out.append((FILTER_FUNDING, {"$or": [{"funding_max": {"$gte": need}}, {"funding_max": {"$lte": 0}}]}))
+    if FILTER_PROGRAM_TYPE != "off" and FILTER_PROGRAM_TYPES:
+        out.append((FILTER_PROGRAM_TYPE, {"program_type": {"$in": list(FILTER_PROGRAM_TYPES)}}))
+    return out
+
+def build_where(user_project: Dict[str, Any], include_soft: bool = True,
+                stage_flags: bool = True) -> Optional[Dict[str, Any]]:
+    """`stage_flags=False` leaves out the stage rule, for an index that has no stage_* metadata."""
+    levels = ("hard", "soft") if include_soft else ("hard",)
+    return _and([clause for level, clause in _rules(user_project, stage_flags) if level in levels])
+
+_OPS = {
+    "$eq": lambda v, a: v == a,
+    "$ne": lambda v, a: v != a,
+    "$in": lambda v, a: v in a,
+    "$nin": lambda v, a: v not in a,
+    "$gt": lambda v, a: v is not None and v > a,
+    "$gte": lambda v, a: v is not None and v >= a,
+    "$lt": lambda v, a: v is not None and v < a,
+    "$lte": lambda v, a: v is not None and v <= a,
+}
+
+def _match_op(value: Any, cond: Any) -> bool:
+    if not isinstance(cond, dict):
+        return value == cond
+    return all(_OPS[op](value, arg) for op, arg in cond.items())
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Chroma-style `where` clause against one metadata dict."""
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            ok = all(matches_where(metadata, c) for c in cond)
+        elif key == "$or":
+            ok = any(matches_where(metadata, c) for c in cond)
+        else:
+            ok = _match_op(metadata.get(key), cond)
+        if not ok:
+            return False
+    return True
@@ -0,0 +1,223 @@
+# matcher/jobs.py
+"""
+Background match jobs.
+
+Jobs are persisted in a local SQLite table so they survive restarts, run on a
+bounded thread pool, and are coalesced per project: enqueueing while a job for
+the same project is still queued/running returns that job instead of a new one.
+The pool starts on the first enqueue if start() was not called.
+
+Several processes may share MATCH_JOBS_DB. A worker claims a job by recording
+its owner id and a lease (MATCH_JOB_LEASE_SECONDS) that a heartbeat thread
+renews while the job runs. Only a "running" job whose lease has expired (its
+process died mid-run) is queued again, at start and on every heartbeat, until it
+has been tried MATCH_JOB_MAX_ATTEMPTS times, then marked failed.
+"""
+from __future__ import annotations
+import json, logging, os, socket, sqlite3, threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import MATCH_JOBS_DB, MATCH_WORKERS, MATCH_JOB_MAX_ATTEMPTS, MATCH_JOB_LEASE_SECONDS
+
+log = logging.getLogger(__name__)
+
+ACTIVE = ("queued", "running")
+
+# coarse progress per pipeline stage reported by run_match_and_insert
+STAGE_PROGRESS = {"retrieval": 0.2, "scoring": 0.8, "persisted": 1.0}
+
+
+class MatchJobQueue:
+    def __init__(self, path: str = MATCH_JOBS_DB, workers: int = MATCH_WORKERS,
+                 runner: Optional[Callable[..., Dict[str, Any]]] = None,
+                 max_attempts: int = MATCH_JOB_MAX_ATTEMPTS,
+                 lease_seconds: float = MATCH_JOB_LEASE_SECONDS):
+        self.path = path
+        self.workers = max(1, int(workers))
+        self.max_attempts = max(1, int(max_attempts))
+        self.lease_seconds = max(1.0, float(lease_seconds))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._runner = runner
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._closed = False
+        self._stop = threading.Event()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS match_jobs ("
+            " id TEXT PRIMARY KEY, project_id TEXT NOT NULL, status TEXT NOT NULL,"
+            " stage TEXT, progress REAL NOT NULL DEFAULT 0, params TEXT NOT NULL,"
+            " result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL,"
+            " owner TEXT, lease_until REAL)"
+        )
+        # tables created before leases existed
+        cols = {r["name"] for r in self._db.execute("PRAGMA table_info(match_jobs)")}
+        for col, decl in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if col not in cols:
+                self._db.execute(f"ALTER TABLE match_jobs ADD COLUMN {col} {decl}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS match_jobs_project ON match_jobs(project_id, status)")
+        self._db.commit()
+
+    # ---------- lifecycle ----------
+    def start(self) -> int:
+        """Start the worker pool and heartbeat, and submit queued jobs and ones whose lease expired."""
+        with self._lock:
+            if self._pool is not None:
+                return 0
+            self._pool = pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="match-job")
+            self._reclaim_expired()
+            pending = [r["id"] for r in self._db.execute(
+                "SELECT id FROM match_jobs WHERE status='queued' ORDER BY created_at")]
+        threading.Thread(target=self._heartbeat, name="match-job-heartbeat", daemon=True).start()
+        for job_id in pending:
+            pool.submit(self._run, job_id)
+        if pending:
+            log.info("match jobs: submitted %d pending job(s)", len(pending))
+        return len(pending)
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+            self._closed = True
+        self._stop.set()
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _reclaim_expired(self) -> List[str]:
+        """Fail or requeue running jobs whose lease expired; returns the requeued ids. Caller holds _lock."""
+        now = time.time()
+        expired = "status='running' AND (lease_until IS NULL OR lease_until<?)"
+        gave_up = self._db.execute(
+            f"UPDATE match_jobs SET status='failed', error=?, owner=NULL, updated_at=? WHERE {expired} AND attempts>=?",
+            (f"gave up after {self.max_attempts} attempt(s)", now, now, self.max_attempts)).rowcount
+        requeued = [r["id"] for r in self._db.execute(f"SELECT id FROM match_jobs WHERE {expired}", (now,))]
+        self._db.execute(
+            "UPDATE match_jobs SET status='queued', stage=NULL, progress=0, owner=NULL, lease_until=NULL,"
+            f" updated_at=? WHERE {expired}", (now, now))
+        self._db.commit()
+        if gave_up:
+            log.warning("match jobs: failed %d job(s) interrupted %d time(s)", gave_up, self.max_attempts)
+        if requeued:
+            log.info("match jobs: requeued %d job(s) whose lease expired", len(requeued))
+        return requeued
+
+    def _heartbeat(self) -> None:
+        """Renew the leases of this process's running jobs; pick up jobs other processes abandoned."""
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                with self._lock:
+                    self._db.execute("UPDATE match_jobs SET lease_until=? WHERE owner=? AND status='running'",
+                                     (time.time() + self.lease_seconds, self.owner))
+                    requeued = self._reclaim_expired()
+                    pool = self._pool
+                for job_id in requeued if pool is not None else ():
+                    pool.submit(self._run, job_id)
+            except Exception as e:
+                log.warning("match jobs: heartbeat failed: %s", e)
+
+    # ---------- API ----------
+    def enqueue(self, project_row: Dict[str, Any], top_k: int = 5,
+                calibration: Optional[str] = "relative_minmax") -> Dict[str, Any]:
+        pid = str(project_row["id"])
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM match_jobs WHERE project_id=? AND status IN (?, ?)"
+                " ORDER BY created_at DESC LIMIT 1", (pid, *ACTIVE)).fetchone()
+            if row is not None:
+                job = self._as_dict(row)
+                job["coalesced"] = True
+                return job
+            now = time.time()
+            job_id = uuid.uuid4().hex
+            params = {"project_row": project_row, "top_k": top_k, "calibration": calibration}
+            self._db.execute(
+                "INSERT INTO match_jobs(id, project_id, status, params, created_at, updated_at)"
+                " VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, pid, json.dumps(params, ensure_ascii=False, default=str), now, now))
+            self._db.commit()
+            pool, closed = self._pool, self._closed
+        if pool is not None:
+            pool.submit(self._run, job_id)
+        elif not closed:
+            self.start()        # submits every queued job, this one included
+        job = self.get(job_id)
+        job["coalesced"] = False
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM match_jobs WHERE id=?", (job_id,)).fetchone()
+        return self._as_dict(row) if row is not None else None
+
+    # ---------- worker ----------
+    def _run(self, job_id: str) -> None:
+        with self._lock:
+            now = time.time()
+            # the status check makes the claim atomic across processes sharing the database
+            claimed = self._db.execute(
+                "UPDATE match_jobs SET status='running', attempts=attempts+1, owner=?, lease_until=?, updated_at=?"
+                " WHERE id=? AND status='queued'", (self.owner, now + self.lease_seconds, now, job_id)).rowcount
+            self._db.commit()
+            if not claimed:
+                return
+            row = self._db.execute("SELECT params FROM match_jobs WHERE id=?", (job_id,)).fetchone()
+        params = json.loads(row["params"])
+        runner = self._runner
+        if runner is None:
+            from .service import run_match_and_insert as runner
+
+        def on_progress(stage: str, info: Dict[str, Any]) -> None:
+            self._update(job_id, stage=stage, progress=STAGE_PROGRESS.get(stage))
+
+        try:
+            out = runner(params["project_row"], top_k=params["top_k"],
+                         calibration=params["calibration"], on_progress=on_progress)
+            result = {"inserted": out.get("inserted", 0), "run_at": out.get("run_at")}
+            self._update(job_id, status="done", stage="persisted", progress=1.0, result=result)
+        except Exception as e:
+            log.warning("match job %s failed: %s", job_id, e)
+            self._update(job_id, status="failed", error=str(e))
+
+    def _update(self, job_id: str, status: Optional[str] = None, stage: Optional[str] = None,
+                progress: Optional[float] = None, result: Optional[Dict[str, Any]] = None,
+                error: Optional[str] = None) -> None:
+        sets, vals = ["updated_at=?"], [time.time()]
+        for col, v in (("status", status), ("stage", stage), ("progress", progress), ("error", error)):
+            if v is not None:
+                sets.append(f"{col}=?"); vals.append(v)
+        if result is not None:
+            sets.append("result=?"); vals.append(json.dumps(result, ensure_ascii=False))
+        with self._lock:
+            self._db.execute(f"UPDATE match_jobs SET {', '.join(sets)} WHERE id=?", (*vals, job_id))
+            self._db.commit()
+
+    @staticmethod
+    def _as_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "job_id": row["id"],
+            "project_id": row["project_id"],
+            "status": row["status"],
+            "stage": row["stage"],
+            "progress": row["progress"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+
+_queue: Optional[MatchJobQueue] = None
+_queue_lock = threading.Lock()
+
+def get_job_queue() -> MatchJobQueue:
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = MatchJobQueue()
+        return _queue
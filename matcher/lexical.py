@@ -0,0 +1,110 @@
+# matcher/lexical.py
+"""
+BM25 inverted index over the program index_text, for hybrid retrieval.
+
+Tokens go through matcher.arabic.tokens_ar (orthography folding, diacritics,
+definite article), so "المنشآت" and "منشات" meet. The index is precomputed by
+build_md_json_index (json_to_lexical) into one JSON file holding the postings,
+document lengths and the program id per document. The text is only needed to
+build the postings; records, texts and the filter flags come from the program
+catalog, which also turns hits back into Documents.
+"""
+from __future__ import annotations
+import json, math, os, tempfile, threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from .arabic import tokens_ar
+from .filters import matches_where
+from .catalog import get_catalog
+from .config import LEXICAL_INDEX_PATH
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+class BM25Index:
+    def __init__(self, postings: Dict[str, List[List[int]]], doc_len: List[int],
+                 ids: List[str], k1: float = BM25_K1, b: float = BM25_B):
+        self.postings = postings
+        self.doc_len = doc_len
+        self.ids = [str(i) for i in ids]
+        self.k1, self.b = k1, b
+        n = len(doc_len)
+        self.avgdl = (sum(doc_len) / n) if n else 0.0
+        self.idf = {t: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for t, p in postings.items()}
+
+    @classmethod
+    def build(cls, docs: List[Document]) -> "BM25Index":
+        postings: Dict[str, List[List[int]]] = {}
+        doc_len = []
+        for i, doc in enumerate(docs):
+            toks = tokens_ar(doc.page_content)
+            doc_len.append(len(toks))
+            for t, tf in Counter(toks).items():
+                postings.setdefault(t, []).append([i, tf])
+        return cls(postings, doc_len, [d.metadata.get("id") for d in docs])
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        raw = json.loads(Path(path).read_text(encoding="utf-8"))
+        ids = raw.get("ids") or [d.get("id") or (d.get("metadata") or {}).get("id") for d in raw["docs"]]
+        return cls(raw["postings"], raw["doc_len"], ids, raw.get("k1", BM25_K1), raw.get("b", BM25_B))
+
+    def save(self, path: str) -> None:
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        raw = {"k1": self.k1, "b": self.b, "ids": self.ids, "doc_len": self.doc_len, "postings": self.postings}
+        fd, tmp = tempfile.mkstemp(dir=p.parent, suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(raw, f, ensure_ascii=False)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, p)
+
+    def search_ids(self, query: str, k: int, where: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """
+        Top-k (program id, bm25 score), best first; documents with no query term are never
+        returned. `where` is evaluated on the catalog records.
+        """
+        allowed = None
+        if where:
+            catalog = get_catalog()
+            allowed = {i for i, pid in enumerate(self.ids) if matches_where(catalog.get(pid) or {}, where)}
+        scores: Dict[int, float] = {}
+        for t, qtf in Counter(tokens_ar(query)).items():
+            idf = self.idf.get(t)
+            if idf is None:
+                continue
+            for i, tf in self.postings[t]:
+                if allowed is not None and i not in allowed:
+                    continue
+                norm = tf + self.k1 * (1 - self.b + self.b * self.doc_len[i] / (self.avgdl or 1.0))
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / norm
+        best = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:k]
+        return [(self.ids[i], s) for i, s in best]
+
+    def search(self, query: str, k: int, where: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        """search_ids() hydrated from the catalog as (Document, bm25 score)."""
+        return get_catalog().hydrate(self.search_ids(query, k, where))
+
+
+_lexical: Optional[BM25Index] = None
+_lexical_lock = threading.Lock()
+
+def get_lexical_index() -> Optional[BM25Index]:
+    """Process-wide BM25 index, or None if LEXICAL_INDEX_PATH has not been built."""
+    global _lexical
+    with _lexical_lock:
+        if _lexical is None and Path(LEXICAL_INDEX_PATH).exists():
+            _lexical = BM25Index.load(LEXICAL_INDEX_PATH)
+        return _lexical
+
+def reload_lexical_index() -> Optional[BM25Index]:
+    global _lexical
+    fresh = BM25Index.load(LEXICAL_INDEX_PATH) if Path(LEXICAL_INDEX_PATH).exists() else None
+    with _lexical_lock:
+        _lexical = fresh
+    return fresh
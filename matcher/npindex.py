@@ -0,0 +1,166 @@
+# matcher/npindex.py
+"""
+Exact-search vector index over one contiguous float32 matrix.
+
+The program catalog is a few dozen documents, so a brute-force cosine top-k is
+a single matrix-vector product and needs no ANN structure. Each build is
+written to its own version directory and published by replacing one pointer
+file, so a reader always gets a matrix and ids from the same build:
+
+    CURRENT                    name of the live version directory
+    <version>/embeddings.npy   (n, dim) float32, rows L2-normalized, memory-mapped on load
+    <version>/ids.json         program id per row
+
+Only ids are stored; records, texts and the filter flags come from the program
+catalog (matcher/catalog.py). A directory without CURRENT is read as one flat
+version, and an older docs.json ([{"id", "page_content", "metadata"}]) is read
+for its ids only.
+
+`NumpyIndex.similarity_search_with_score` returns the same (Document, cosine
+distance) tuples as Chroma with hnsw:space=cosine, so it is a drop-in for
+`retrieve_candidates`. Built by build_md_json_index (json_to_numpy, or
+chroma_to_numpy to export an existing Chroma collection without re-embedding).
+"""
+from __future__ import annotations
+import hashlib, json, os, shutil, tempfile, time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .catalog import get_catalog
+from .filters import matches_where
+
+EMBEDDINGS_FILE = "embeddings.npy"
+IDS_FILE = "ids.json"
+DOCS_FILE = "docs.json"    # pre-catalog layout, read for its ids
+POINTER_FILE = "CURRENT"
+KEEP_VERSIONS = 2          # the live build and the one before it, for readers still opening it
+
+
+def _normalize_rows(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (m / norms).astype(np.float32)
+
+
+class NumpyIndex:
+    def __init__(self, matrix: np.ndarray, ids: List[str], embedding_function: Any = None):
+        if matrix.ndim != 2 or matrix.shape[0] != len(ids):
+            raise ValueError(f"index shape {matrix.shape} does not match {len(ids)} ids")
+        self.matrix = matrix
+        self.ids = [str(i) for i in ids]
+        self.embedding_function = embedding_function
+
+    @classmethod
+    def load(cls, directory: str, embedding_function: Any = None, mmap: bool = True) -> "NumpyIndex":
+        matrix, ids = read_index_files(directory, mmap)
+        return cls(matrix, ids, embedding_function)
+
+    def _mask(self, where: Dict[str, Any]) -> np.ndarray:
+        catalog = get_catalog()
+        return np.fromiter((matches_where(catalog.get(pid) or {}, where) for pid in self.ids), bool, len(self.ids))
+
+    def count(self, where: Optional[Dict[str, Any]] = None) -> int:
+        if not where:
+            return len(self.ids)
+        return int(self._mask(where).sum())
+
+    @property
+    def embeddings(self) -> Any:
+        return self.embedding_function
+
+    def _top(self, embedding: Sequence[float], k: int, filter: Optional[Dict[str, Any]]) -> List[Tuple[int, float]]:
+        q = np.asarray(embedding, dtype=np.float32)
+        n = float(np.linalg.norm(q))
+        if n > 0:
+            q = q / n
+        sims = self.matrix @ q
+        if filter:
+            mask = self._mask(filter)
+            sims = np.where(mask, sims, -np.inf)
+            k = min(k, int(mask.sum()))
+        k = min(k, sims.shape[0])
+        if k <= 0:
+            return []
+        top = np.argpartition(-sims, k - 1)[:k] if k < sims.shape[0] else np.arange(sims.shape[0])
+        top = top[np.argsort(-sims[top], kind="stable")]
+        return [(int(i), float(1.0 - sims[i])) for i in top]
+
+    def search_ids_by_vector(self, embedding: Sequence[float], k: int = 4,
+                             filter: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """(program id, cosine distance), best first. `filter` takes the same `where` clause as
+        Chroma, evaluated on the catalog records; excluded rows never make the top-k."""
+        return [(self.ids[i], d) for i, d in self._top(embedding, k, filter)]
+
+    def similarity_search_by_vector_with_score(self, embedding: Sequence[float], k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        """search_ids_by_vector hydrated from the catalog."""
+        return get_catalog().hydrate(self.search_ids_by_vector(embedding, k, filter))
+
+    def similarity_search_with_score(self, query: str, k: int = 4,
+                                     filter: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        if self.embedding_function is None:
+            raise ValueError("NumpyIndex needs an embedding_function for text queries")
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k=k, filter=filter)
+
+
+def _current_dir(directory: str) -> Path:
+    d = Path(directory)
+    pointer = d / POINTER_FILE
+    return d / pointer.read_text(encoding="utf-8").strip() if pointer.exists() else d
+
+def index_exists(directory: str) -> bool:
+    return (_current_dir(directory) / EMBEDDINGS_FILE).exists()
+
+def _read_ids(v: Path) -> List[str]:
+    if (v / IDS_FILE).exists():
+        return json.loads((v / IDS_FILE).read_text(encoding="utf-8"))
+    rows = json.loads((v / DOCS_FILE).read_text(encoding="utf-8"))
+    return [r.get("id") or (r.get("metadata") or {}).get("id") for r in rows]
+
+def read_index_files(directory: str, mmap: bool = True, retries: int = 3) -> Tuple[np.ndarray, List[str]]:
+    """(matrix, row ids) of the live version; retried if a publish prunes it mid-read."""
+    for attempt in range(retries):
+        v = _current_dir(directory)
+        try:
+            matrix = np.load(v / EMBEDDINGS_FILE, mmap_mode="r" if mmap else None)
+            return matrix, _read_ids(v)
+        except FileNotFoundError:
+            if attempt == retries - 1:
+                raise
+
+def publish_index(directory: str, matrix: np.ndarray, ids: List[str]) -> str:
+    """
+    Write a new version directory and point CURRENT at it (one os.replace), then
+    prune all but the last KEEP_VERSIONS versions. Returns the version name.
+    """
+    d = Path(directory)
+    d.mkdir(parents=True, exist_ok=True)
+    raw = json.dumps([str(i) for i in ids], ensure_ascii=False)
+    digest = hashlib.sha256(np.ascontiguousarray(matrix).tobytes() + raw.encode("utf-8")).hexdigest()[:12]
+    version = f"v{time.time_ns()}-{digest}"     # names sort in publish order
+    tmp_dir = Path(tempfile.mkdtemp(dir=d, prefix=".tmp-"))
+    np.save(tmp_dir / EMBEDDINGS_FILE, np.asarray(matrix, dtype=np.float32))
+    (tmp_dir / IDS_FILE).write_text(raw, encoding="utf-8")
+    tmp_dir.chmod(0o755)
+    os.replace(tmp_dir, d / version)
+
+    fd, tmp = tempfile.mkstemp(dir=d, prefix=".tmp-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, d / POINTER_FILE)
+
+    versions = sorted(p.name for p in d.iterdir() if p.is_dir() and p.name.startswith("v"))
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(d / old, ignore_errors=True)
+    for flat in (EMBEDDINGS_FILE, DOCS_FILE):      # pre-versioning layout, shadowed by CURRENT now
+        (d / flat).unlink(missing_ok=True)
+    return version
+
+def write_index(directory: str, vectors: Sequence[Sequence[float]], ids: List[str]) -> str:
+    """Publish embeddings + row ids as a new index version; a live reader never pairs files from two builds."""
+    matrix = _normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1))
+    return publish_index(directory, matrix, ids)
@@ -40,3 +40,142 @@ Rules:
 Return JSON: sector_match, stage_match, funding_match, goal_alignment, reasons, improvements.
 """
 
+
+
+BATCH_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+BATCH MODE:
+- You will receive SEVERAL programs, each introduced by its program_id. Score each one independently against the PROJECT.
+- Return a JSON array with exactly one object per program_id. Each object has the key program_id (copied verbatim) plus the keys above.
+"""
+
+
+
+BATCH_USER_PROMPT_TEMPLATE = """Evaluate fit between the PROJECT and EACH PROGRAM below.
+
+PROJECT:
+- name: {project_name}
+- description: {project_description}
+- sectors: {project_sectors}
+- stage: {project_stage}
+- funding_need: {project_funding_need}
+- goals: {project_goals}
+
+PROGRAMS (condensed):
+{programs_block}
+
+Rules:
+- Score every program_id listed above exactly once; do not merge or skip programs.
+- sector_match, stage_match, funding_match ∈ {{0.0,0.1,...,1.0}} (numbers, not strings)
+- goal_alignment ∈ [0,1] (number, not string)
+- reasons/improvements MUST be PROJECT-specific, in Arabic (BD-style), concise (2–5 items), and where possible include concrete numbers/timeframes.
+- Use ASCII digits (0-9) and '.' for all numbers. Do NOT use Arabic-Indic numerals. No extra keys. No text outside the JSON.
+Return a JSON array of objects: program_id, sector_match, stage_match, funding_match, goal_alignment, reasons, improvements.
+"""
+
+
+# ---- two-phase mode: numbers for every candidate, text only for the persisted top-k ----
+
+SCORE_ONLY_SYSTEM_PROMPT = """You are a strict evaluator that ONLY scores how well a program fits THIS USER PROJECT.
+Scores must reflect the PROJECT's needs: sector, stage, funding, and goals.
+Output must be compact JSON, nothing else: ASCII digits, '.' as decimal point, no quotes around numbers, no code fences.
+Keys must be exactly: sector_match, stage_match, funding_match, goal_alignment.
+"""
+
+
+
+SCORE_ONLY_USER_PROMPT_TEMPLATE = """Score fit between the PROJECT and ONE PROGRAM.
+
+PROJECT:
+- name: {project_name}
+- description: {project_description}
+- sectors: {project_sectors}
+- stage: {project_stage}
+- funding_need: {project_funding_need}
+- goals: {project_goals}
+
+PROGRAM (condensed):
+{program_text}
+
+Rules:
+- sector_match, stage_match, funding_match ∈ {{0.0,0.1,...,1.0}}
+- goal_alignment ∈ [0,1]
+Return JSON: sector_match, stage_match, funding_match, goal_alignment.
+"""
+
+
+
+EXPLAIN_SYSTEM_PROMPT = """You explain an already-computed fit score between a program and THIS USER PROJECT.
+Do NOT describe the program generally. Focus on tailored reasons about the PROJECT.
+Output must be compact JSON, nothing else. Keys must be exactly: reasons, improvements.
+
+For `reasons` and `improvements`:
+- Language: Arabic.
+- Style: Business Development (محددة، قابلة للتنفيذ، خاصة بالمشروع؛ تجنب العموميات).
+- استخدم تفاصيل ملموسة عندما تتوفر (أرقام، حدود تمويل، نطاقات، أهلية، قنوات، KPIs).
+- 2–5 عناصر قصيرة لكل منهما.
+- التحسينات تخص المشروع فقط لرفع التوافق مع البرنامج (لا تغييرات على البرنامج نفسه).
+- إذا كانت معلومات ناقصة، أضف تحسينًا بصيغة: "Missing: <العنصر>" دون تخمين.
+- Use ASCII digits (0-9); do NOT use Arabic-Indic numerals.
+"""
+
+
+
+EXPLAIN_USER_PROMPT_TEMPLATE = """Explain the fit between the PROJECT and the PROGRAM given these scores.
+
+PROJECT:
+- name: {project_name}
+- description: {project_description}
+- sectors: {project_sectors}
+- stage: {project_stage}
+- funding_need: {project_funding_need}
+- goals: {project_goals}
+
+PROGRAM (condensed):
+{program_text}
+
+SCORES: {scores}
+
+Return JSON: reasons, improvements.
+"""
+
+
+# ---- hybrid mode: the rule engine owns sector/stage/funding, the LLM only the rest ----
+
+HYBRID_SYSTEM_PROMPT = """You are a strict evaluator of how well a program serves the GOALS of THIS USER PROJECT.
+Sector, stage and funding fit are computed elsewhere; do NOT score them.
+Output must be compact JSON, nothing else. Keys must be exactly: goal_alignment, reasons, improvements.
+
+STRICT JSON REQUIREMENTS:
+- Use standard JSON only: ASCII digits 0-9 for numbers, '.' as decimal point, no quotes around numeric scores, no code fences.
+- Do NOT use Arabic-Indic numerals (٠١٢٣٤٥٦٧٨٩) for any numbers.
+
+For `reasons` and `improvements` ONLY:
+- Language: Arabic.
+- Style: Business Development (محددة، قابلة للتنفيذ، خاصة بالمشروع؛ تجنب العموميات).
+- استخدم تفاصيل ملموسة عندما تتوفر (أرقام، حدود تمويل، نطاقات، أهلية، قنوات، KPIs).
+- 2–5 عناصر قصيرة لكل منهما.
+- التحسينات تخص المشروع فقط لرفع التوافق مع البرنامج (لا تغييرات على البرنامج نفسه).
+- إذا كانت معلومات ناقصة، أضف تحسينًا بصيغة: "Missing: <العنصر>" دون تخمين.
+"""
+
+
+
+HYBRID_USER_PROMPT_TEMPLATE = """Evaluate how well ONE PROGRAM serves the PROJECT's goals.
+
+PROJECT:
+- name: {project_name}
+- description: {project_description}
+- sectors: {project_sectors}
+- stage: {project_stage}
+- funding_need: {project_funding_need}
+- goals: {project_goals}
+
+PROGRAM (condensed):
+{program_text}
+
+Rules:
+- goal_alignment ∈ [0,1] (number, not string)
+- reasons/improvements MUST be PROJECT-specific, in Arabic (BD-style), concise (2–5 items), and where possible include concrete numbers/timeframes.
+- Use ASCII digits (0-9) and '.' for all numbers. Do NOT use Arabic-Indic numerals. No extra keys. No text outside the JSON.
+Return JSON: goal_alignment, reasons, improvements.
+"""
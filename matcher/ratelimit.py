@@ -0,0 +1,50 @@
+# matcher/ratelimit.py
+"""
+Thread-safe request + token rate limiter (two token buckets refilled continuously).
+
+    limiter = RateLimiter(rpm=500, tpm=200_000)
+    limiter.acquire(tokens=estimated_prompt_and_output_tokens)   # blocks until both budgets allow it
+
+Each bucket holds at most one minute of budget, so a cold start can burst up to
+the per-minute limit. 0 disables a bucket.
+"""
+from __future__ import annotations
+import threading, time
+from typing import Callable
+
+
+class RateLimiter:
+    def __init__(self, rpm: float = 0, tpm: float = 0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rpm, self.tpm = float(rpm), float(tpm)
+        self._clock, self._sleep = clock, sleep
+        self._requests, self._tokens = self.rpm, self.tpm
+        self._last = clock()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def _refill(self) -> None:
+        now = self._clock()
+        elapsed, self._last = now - self._last, now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def acquire(self, tokens: int = 0) -> None:
+        # a single call larger than the whole minute budget waits for a full bucket, not forever
+        need_tokens = min(float(tokens), self.tpm)
+        while True:
+            with self._lock:
+                self._refill()
+                short_r = (1.0 - self._requests) if self.rpm else 0.0
+                short_t = (need_tokens - self._tokens) if self.tpm else 0.0
+                if short_r <= 0 and short_t <= 0:
+                    if self.rpm:
+                        self._requests -= 1.0
+                    if self.tpm:
+                        self._tokens -= need_tokens
+                    return
+                wait = max(short_r * 60.0 / self.rpm if short_r > 0 else 0.0,
+                           short_t * 60.0 / self.tpm if short_t > 0 else 0.0)
+                self.waited += wait
+            self._sleep(wait)
@@ -1,5 +1,12 @@
-from typing import Dict, Any, List, Tuple
+import logging, math, weakref
+from typing import Dict, Any, List, Optional, Tuple
 from langchain_core.documents import Document
+from .config import RETRIEVAL_MODE, RRF_K, HYBRID_POOL_FACTOR
+from .filters import build_where, matches_where
+from .lexical import get_lexical_index
+from .catalog import get_catalog
+
+log = logging.getLogger(__name__)
 
 def build_query_text(project: Dict[str, Any]) -> str:
     name = (project.get("name") or "").strip()
@@ -10,6 +17,126 @@ def build_query_text(project: Dict[str, Any]) -> str:
     goals = ", ".join(project.get("goals") or [])
     return f"{name}\n{desc}\nSectors: {sectors}\nStage: {stage}\nFundingNeed:{funding}\nGoals:{goals}"
 
-def retrieve_candidates(vectordb, user_project: Dict[str, Any], k: int) -> List[Tuple[Document, float]]:
+def build_lexical_query(project: Dict[str, Any]) -> str:
+    # same fields as the dense query, without the English labels every program text also carries
+    parts = [project.get("name") or "", project.get("description") or "", project.get("stage") or ""]
+    parts += list(project.get("sectors") or []) + list(project.get("goals") or [])
+    return " ".join(str(p) for p in parts if p)
+
+def _doc_key(doc: Document) -> str:
+    md = doc.metadata or {}
+    return str(md.get("id") or md.get("source_path") or doc.page_content[:200])
+
+def rrf_fuse(dense: List[Tuple[Document, float]], lexical: List[Tuple[Document, float]],
+             k: int, rrf_k: int = RRF_K) -> List[Tuple[Document, float]]:
+    """
+    Reciprocal-rank fusion of a dense (doc, distance) list and a lexical (doc, score) list.
+    Returns the top-k as (doc, distance). Dense hits keep their cosine distance; lexical-only
+    hits get the worst distance seen in the dense list, so the content subscore never rewards
+    a document the embedding search did not rank.
+    """
+    fused: Dict[str, float] = {}
+    by_key: Dict[str, Tuple[Document, Optional[float]]] = {}
+    for rank, (doc, dist) in enumerate(dense):
+        key = _doc_key(doc)
+        fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+        by_key[key] = (doc, float(dist))
+    for rank, (doc, _) in enumerate(lexical):
+        key = _doc_key(doc)
+        fused[key] = fused.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+        by_key.setdefault(key, (doc, None))
+
+    floor = max((float(d) for _, d in dense), default=1.0)
+    order = sorted(fused, key=lambda key: -fused[key])[:k]   # stable: dense order breaks ties
+    return [(by_key[key][0], by_key[key][1] if by_key[key][1] is not None else floor) for key in order]
+
+# Chroma ids of collections built before records were keyed by program id -> program id;
+# valid for one catalog version (a reload can add, drop or re-key programs)
+_id_alias: Dict[str, str] = {}
+_id_alias_version: Optional[str] = None
+
+def _program_ids(vectordb, hits: List[Tuple[str, float]]) -> List[Tuple[str, float]]:
+    global _id_alias, _id_alias_version
+    catalog = get_catalog()
+    if catalog.version != _id_alias_version:
+        _id_alias, _id_alias_version = {}, catalog.version
+    missing = [i for i, _ in hits if i not in catalog and i not in _id_alias]
+    if missing:
+        got = vectordb._collection.get(ids=missing, include=["metadatas"])
+        for i, md in zip(got["ids"], got["metadatas"]):
+            _id_alias[i] = str((md or {}).get("id") or i)
+    return [(_id_alias.get(i, i), d) for i, d in hits]
+
+def _dense_ids(vectordb, query: str, k: int, where: Optional[Dict[str, Any]]) -> List[Tuple[str, float]]:
+    """(program id, cosine distance) only; no document payload comes back from the store."""
+    vector = vectordb.embeddings.embed_query(query)
+    if hasattr(vectordb, "search_ids_by_vector"):
+        return vectordb.search_ids_by_vector(vector, k=k, filter=where)
+    res = vectordb._collection.query(query_embeddings=[vector], n_results=k, include=["distances"],
+                                     **({"where": where} if where else {}))
+    return _program_ids(vectordb, list(zip(res["ids"][0], res["distances"][0])))
+
+def _dense(vectordb, query: str, k: int, where: Optional[Dict[str, Any]]) -> List[Tuple[Document, float]]:
+    return get_catalog().hydrate(_dense_ids(vectordb, query, k, where))  # (doc, distance)
+
+# store -> whether its metadata carries the stage flags (checked once per opened store)
+_flags_checked: "weakref.WeakKeyDictionary[Any, bool]" = weakref.WeakKeyDictionary()
+_HAS_FLAGS = {"has_stage_tags": {"$in": [True, False]}}
+
+def _has_stage_flags(vectordb) -> bool:
+    ok = _flags_checked.get(vectordb)
+    if ok is None:
+        if hasattr(vectordb, "count"):
+            ok = vectordb.count(_HAS_FLAGS) > 0
+        else:
+            ok = bool(vectordb._collection.get(where=_HAS_FLAGS, limit=1, include=[])["ids"])
+        if not ok:
+            log.warning("vector index has no stage_* metadata; the stage pre-filter is skipped until "
+                        "`python -m matcher.build_md_json_index --backfill-metadata` (or a build) adds it")
+        _flags_checked[vectordb] = ok
+    return ok
+
+def _filtered_out(where: Dict[str, Any]) -> Tuple[int, int]:
+    """(catalog programs excluded by `where`, catalog size), from the catalog's derived flags; no store query."""
+    catalog = get_catalog()
+    return sum(not matches_where(catalog.get(pid), where) for pid in catalog.ids()), len(catalog)
+
+def _search(vectordb, user_project: Dict[str, Any], k: int, mode: Optional[str],
+            where: Optional[Dict[str, Any]]) -> List[Tuple[Document, float]]:
     query = build_query_text(user_project)
-    return vectordb.similarity_search_with_score(query, k=k)  # (doc, distance)
+    lexical_index = get_lexical_index() if (mode or RETRIEVAL_MODE) == "hybrid" else None
+    if lexical_index is None:
+        return _dense(vectordb, query, k, where)
+
+    pool = max(k, math.ceil(HYBRID_POOL_FACTOR * k))
+    dense = _dense(vectordb, query, pool, where)
+    lexical = get_catalog().hydrate(lexical_index.search_ids(build_lexical_query(user_project), k=pool, where=where))
+    return rrf_fuse(dense, lexical, k)
+
+def retrieve_candidates(vectordb, user_project: Dict[str, Any], k: int,
+                        mode: Optional[str] = None) -> List[Tuple[Document, float]]:
+    """
+    mode: "dense" | "hybrid" (defaults to RETRIEVAL_MODE). Hybrid falls back to dense
+    when the BM25 index has not been built.
+    The FILTER_* rules (matcher/filters.py) are pushed into the search; soft rules are
+    relaxed and the list topped up from the hard-filtered search when fewer than k pass.
+    The stores return program ids only; the Documents come from the program catalog.
+    """
+    flags = _has_stage_flags(vectordb)
+    where = build_where(user_project, stage_flags=flags)
+    if where is None:
+        return _search(vectordb, user_project, k, mode, None)
+
+    out = _search(vectordb, user_project, k, mode, where)
+    hard = build_where(user_project, include_soft=False, stage_flags=flags)
+    relaxed = len(out) < k and hard != where
+    if relaxed:
+        seen = {_doc_key(doc) for doc, _ in out}
+        extra = [(doc, d) for doc, d in _search(vectordb, user_project, k, mode, hard) if _doc_key(doc) not in seen]
+        out += extra[:k - len(out)]
+
+    if log.isEnabledFor(logging.INFO):
+        dropped, total = _filtered_out(where)
+        log.info("retrieval prefilter: %d of k=%d candidates returned; filter excludes %d of %d catalog programs%s",
+                 len(out), k, dropped, total, " (soft rules relaxed, fewer than k passed)" if relaxed else "")
+    return out
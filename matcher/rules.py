@@ -0,0 +1,164 @@
+# matcher/rules.py
+"""
+Deterministic rule scorer for the `rule` component (sector / stage / funding).
+
+Stage uses ordinal distance on the same ladder the backend validates against
+(DB_STAGES in back/main.py), funding compares the project's need with the
+program's [funding_min, funding_max] range, and sectors are matched through a
+precomputed synonym table after Arabic normalization.
+"""
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .arabic import normalize_ar, tokens_ar
+
+# ordered version of DB_STAGES
+STAGE_LADDER: Tuple[str, ...] = ("فكرة", "MVP", "إطلاق", "تشغيل", "نمو مبكر", "نمو", "توسع")
+STAGE_ALIASES = {
+    "idea": "فكرة", "ideation": "فكرة",
+    "prototype": "MVP", "mvp": "MVP", "نموذج اولي": "MVP",
+    "launch": "إطلاق", "release": "إطلاق", "اطلاق": "إطلاق",
+    "go-live": "تشغيل", "operate": "تشغيل", "production": "تشغيل",
+    "early_growth": "نمو مبكر", "earlygrowth": "نمو مبكر", "early growth": "نمو مبكر",
+    "growth": "نمو", "scale": "توسع", "expansion": "توسع", "scaleup": "توسع",
+}
+_STAGE_INDEX = {normalize_ar(s): i for i, s in enumerate(STAGE_LADDER)}
+_STAGE_INDEX.update({normalize_ar(k): _STAGE_INDEX[normalize_ar(v)] for k, v in STAGE_ALIASES.items()})
+
+# canonical sector -> spellings seen in projects / program tags / ISIC sector names
+SECTOR_SYNONYMS: Dict[str, Tuple[str, ...]] = {
+    "health": ("الصحة", "صحة", "صحي", "تقنية صحية", "الصحة الرقمية", "صيدليات", "صيدلية", "أدوية",
+               "الأدوية", "توصيل الأدوية", "الصحة والعمل الاجتماعي", "health", "healthtech", "digital health"),
+    "ecommerce": ("التجارة الإلكترونية", "تجارة إلكترونية", "تجارة", "متجر إلكتروني", "التجزئة",
+                  "تجارة الجملة والتجزئة", "e-commerce", "ecommerce", "retail"),
+    "education": ("التعليم", "تعليم", "تعليمي", "مرافق تعليمية", "تقنية التعليم", "edtech", "education"),
+    "ai": ("ذكاء اصطناعي", "الذكاء الاصطناعي", "تعلم الآلة", "ai", "machine learning"),
+    "ict": ("المعلومات والاتصالات", "تقنية المعلومات", "برمجيات", "تقنية", "software", "saas", "it"),
+    "logistics": ("النقل والتخزين", "لوجستيات", "الخدمات اللوجستية", "توصيل", "شحن", "سلاسل إمداد",
+                  "وصفتي/سلاسل إمداد", "logistics", "delivery"),
+    "food": ("الضيافة والطعام", "ضيافة", "أغذية", "مطاعم", "أنشطة خدمات الإقامة والطعام", "food", "hospitality"),
+    "finance": ("الأنشطة المالية وأنشطة التأمين", "تقنية مالية", "استثمار", "fintech", "finance"),
+    "industry": ("الصناعات التحويلية", "صناعة", "تصنيع", "manufacturing"),
+    "women": ("المرأة", "رائدات الأعمال", "رائدات أعمال", "women"),
+}
+# program tags that describe cross-cutting support rather than a sector
+GENERIC_SECTOR_TAGS = ("تحول رقمي", "ريادة الأعمال", "ريادة أعمال", "ابتكار", "اقتصاد معرفي", "شركات ناشئة")
+
+_SECTOR_INDEX: Dict[str, str] = {normalize_ar(v): k for k, vs in SECTOR_SYNONYMS.items() for v in vs}
+_GENERIC = {normalize_ar(t) for t in GENERIC_SECTOR_TAGS}
+
+
+# =========================
+# Normalization
+# =========================
+
+def normalize_stage(v: Optional[str]) -> Optional[int]:
+    """Ladder index for a stage label (Arabic or alias), or None when unknown."""
+    if not v:
+        return None
+    return _STAGE_INDEX.get(normalize_ar(str(v)))
+
+def canonical_sectors(values: Iterable[str]) -> set:
+    out = set()
+    for v in values or []:
+        key = normalize_ar(str(v))
+        if key in _SECTOR_INDEX:
+            out.add(_SECTOR_INDEX[key])
+            continue
+        # multi-word project entries: match on any known synonym they contain
+        for syn, canon in _SECTOR_INDEX.items():
+            if len(syn) > 3 and syn in key:
+                out.add(canon)
+    return out
+
+def _as_list(v: Any) -> List[str]:
+    if v is None:
+        return []
+    if isinstance(v, str):
+        return [x.strip() for x in v.split(",") if x.strip()]
+    return [str(x) for x in v]
+
+
+# =========================
+# Subscores (all in [0,1])
+# =========================
+
+def stage_score(project_stage: Optional[str], stage_tags: Iterable[str]) -> float:
+    p = normalize_stage(project_stage)
+    tags = [i for i in (normalize_stage(t) for t in stage_tags or []) if i is not None]
+    if p is None or not tags:
+        return 0.5  # unknown on either side
+    d = min(abs(p - t) for t in tags)
+    return max(0.0, 1.0 - 0.3 * d)
+
+def funding_score(need: Any, fmin: Any, fmax: Any) -> float:
+    try:
+        need = float(need or 0.0)
+        lo, hi = float(fmin or 0.0), float(fmax or 0.0)
+    except (TypeError, ValueError):
+        return 0.5
+    if need <= 0:
+        return 1.0
+    if hi <= 0 and lo <= 0:
+        return 0.5  # in-kind / amounts not published
+    if lo <= need <= (hi or need):
+        return 1.0
+    if hi and need > hi:
+        return hi / need          # program covers part of the need
+    return need / lo if lo else 0.5  # program tickets start above the need
+
+def sector_score(project_sectors: Iterable[str], sector_tags: Iterable[str]) -> float:
+    tags = _as_list(sector_tags)
+    if not tags:
+        return 0.5
+    want = canonical_sectors(project_sectors)
+    have = canonical_sectors(tags)
+    if want and want & have:
+        return 0.6 + 0.4 * len(want & have) / len(want)
+    if any(normalize_ar(t) in _GENERIC for t in tags):
+        return 0.4
+    return 0.0
+
+def goal_overlap(project: Dict[str, Any], program: Dict[str, Any]) -> float:
+    """Cheap lexical proxy for goal alignment (share of project goal terms the program mentions)."""
+    want = set(tokens_ar(" ".join(_as_list(project.get("goals"))) + " " + (project.get("description") or "")))
+    have = set(tokens_ar(" ".join([
+        " ".join(_as_list(program.get("goals"))),
+        " ".join(_as_list(program.get("features"))),
+        program.get("objectives") or "",
+        program.get("description") or "",
+    ])))
+    want = {t for t in want if len(t) > 2}
+    if not want:
+        return 0.0
+    return min(1.0, 2.0 * len(want & have) / len(want))
+
+def rule_subscores(project: Dict[str, Any], program: Dict[str, Any]) -> Dict[str, float]:
+    return {
+        "sector": sector_score(_as_list(project.get("sectors")), program.get("sector_tags")),
+        "stage": stage_score(project.get("stage"), _as_list(program.get("stage_tags"))),
+        "funding": funding_score(project.get("funding_need"), program.get("funding_min"), program.get("funding_max")),
+    }
+
+def rule_reasons(project: Dict[str, Any], program: Dict[str, Any],
+                 subs: Dict[str, float]) -> Tuple[List[str], List[str]]:
+    """Short Arabic reasons/improvements derived from the rule checks (offline mode)."""
+    reasons, improvements = [], []
+    sectors = _as_list(program.get("sector_tags"))
+    stages = _as_list(program.get("stage_tags"))
+    if subs["sector"] >= 0.6:
+        reasons.append(f"قطاع المشروع يتوافق مع تركيز البرنامج: {', '.join(sectors[:3])}")
+    elif sectors:
+        improvements.append(f"إبراز ارتباط المشروع بمجالات البرنامج: {', '.join(sectors[:3])}")
+    if subs["stage"] >= 0.7:
+        reasons.append(f"مرحلة المشروع ({project.get('stage')}) ضمن المراحل المستهدفة: {', '.join(stages)}")
+    elif stages:
+        improvements.append(f"البرنامج يستهدف مراحل: {', '.join(stages)}؛ جهّز ما يثبت الجاهزية لها")
+    else:
+        improvements.append("Missing: المراحل المستهدفة للبرنامج")
+    if subs["funding"] >= 1.0 and float(program.get("funding_max") or 0) > 0:
+        reasons.append("حجم التمويل المطلوب ضمن نطاق البرنامج")
+    elif float(program.get("funding_max") or 0) <= 0:
+        improvements.append("Missing: حدود التمويل النقدي للبرنامج (الدعم غالبًا غير نقدي)")
+    return reasons, improvements
+
@@ -1,12 +1,22 @@
 # scoring.py
-import json, math, random, re
-from typing import Any, Dict, List, Tuple
+import hashlib, json, logging, math, random, re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 
-from matcher.prompts import SYSTEM_PROMPT, USER_PROMPT_TEMPLATE
-from matcher.config import OPENAI_MODEL, SEED_DEFAULT
+from matcher.prompts import (SYSTEM_PROMPT, USER_PROMPT_TEMPLATE,
+                             BATCH_SYSTEM_PROMPT, BATCH_USER_PROMPT_TEMPLATE,
+                             SCORE_ONLY_SYSTEM_PROMPT, SCORE_ONLY_USER_PROMPT_TEMPLATE,
+                             EXPLAIN_SYSTEM_PROMPT, EXPLAIN_USER_PROMPT_TEMPLATE,
+                             HYBRID_SYSTEM_PROMPT, HYBRID_USER_PROMPT_TEMPLATE)
+from matcher.config import OPENAI_MODEL, SEED_DEFAULT, LLM_CONCURRENCY, SCORING_BATCH_SIZE
+from matcher.cache import ScoreCache, get_score_cache, score_key, prompt_version
+from matcher.rules import rule_subscores, rule_reasons, goal_overlap
+from matcher.catalog import program_record, program_id
+
+log = logging.getLogger(__name__)
 
 
 # =========================
@@ -94,9 +104,26 @@ def _parse_first_json(txt: str) -> Dict[str, Any]:
         raise ValueError("LLM response missing JSON")
     return json.loads(s[i:j+1])
 
+def _parse_json_array(txt: str) -> List[Any]:
+    s = txt.strip()
+    i, j = s.find("["), s.rfind("]")
+    if i == -1 or j == -1 or j <= i:
+        # some models wrap the array: {"results": [...]}
+        obj = _parse_first_json(s)
+        for v in obj.values():
+            if isinstance(v, list):
+                return v
+        raise ValueError("LLM response missing JSON array")
+    arr = json.loads(s[i:j+1])
+    if not isinstance(arr, list):
+        raise ValueError("LLM response is not a JSON array")
+    return arr
+
 def _program_text(doc: Any) -> str:
-    """Condense program metadata into a compact text for LLM scoring."""
-    md = doc.metadata or {}
+    """Compact program text for LLM scoring: the card precomputed at index time, else built from the record."""
+    md = program_record(doc)
+    if md.get("program_card"):
+        return md["program_card"]
     name   = md.get("name") or md.get("program_name") or md.get("title") or "Program"
     desc   = md.get("description") or ""
     obj    = md.get("objectives") or ""
@@ -131,71 +158,533 @@ def _program_text(doc: Any) -> str:
 # Main ranking API
 # =========================
 
+def _scoring_llm(seed: int) -> ChatOpenAI:
+    return ChatOpenAI(model=OPENAI_MODEL, temperature=0, top_p=1, seed=seed)
+
+FULL_EVAL = (SYSTEM_PROMPT, USER_PROMPT_TEMPLATE)
+SCORE_ONLY = (SCORE_ONLY_SYSTEM_PROMPT, SCORE_ONLY_USER_PROMPT_TEMPLATE)
+EXPLAIN = (EXPLAIN_SYSTEM_PROMPT, EXPLAIN_USER_PROMPT_TEMPLATE)
+BATCH_EVAL = (BATCH_SYSTEM_PROMPT, BATCH_USER_PROMPT_TEMPLATE)
+HYBRID_EVAL = (HYBRID_SYSTEM_PROMPT, HYBRID_USER_PROMPT_TEMPLATE)
+
+def _scoring_prompt(templates: Tuple[str, str] = FULL_EVAL) -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages([
+        ("system", templates[0]),
+        ("user",   templates[1])
+    ])
+
+def _format_messages(prompt: ChatPromptTemplate, user_project: Dict[str, Any], doc: Any, **extra):
+    return prompt.format_messages(
+        **extra,
+        project_name=user_project.get("name", ""),
+        project_description=user_project.get("description", ""),
+        project_sectors=user_project.get("sectors", []),
+        project_stage=user_project.get("stage", ""),
+        project_funding_need=user_project.get("funding_need", ""),
+        project_goals=user_project.get("goals", []),
+        program_text=_program_text(doc),
+    )
+
+def _score_candidate(doc: Any, distance: float, evd: Dict[str, Any],
+                     weights: Tuple[float, float, float]) -> Dict[str, Any]:
+    """Turn one normalized LLM eval into the ranked-result dict."""
+    sector  = _round_tenth(evd["sector_match"])
+    stage   = _round_tenth(evd["stage_match"])
+    funding = _round_tenth(evd["funding_match"])
+    goal    = _safe_01(evd["goal_alignment"])
+
+    rule    = 0.4 * sector + 0.4 * stage + 0.2 * funding
+    content = _content_from_distance(distance)     # cosine distance -> similarity
+    final_raw = weights[0]*rule + weights[1]*content + weights[2]*goal
+
+    return {
+        "doc": doc,
+        "raw_distance": float(distance),
+        "scores": {
+            "rule": rule,
+            "content": content,
+            "goal": goal,
+            "final_raw": final_raw
+        },
+        "subscores": {
+            "sector": sector,
+            "stage":  stage,
+            "funding": funding
+        },
+        "reasons": evd["reasons"],           # normalized List[str]
+        "improvements": evd["improvements"], # normalized List[str]
+    }
+
+def _rank(out: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # stable sort: ties keep retrieval order, so runs are reproducible
+    out.sort(key=lambda r: r["scores"]["final_raw"], reverse=True)
+    for i, r in enumerate(out, start=1):
+        r["rank"] = i
+    return out
+
+def _cache_lookup(cache: Optional[ScoreCache], user_project: Dict[str, Any],
+                  candidates: List[Tuple[Any, float]], seed: int,
+                  templates: Tuple[str, str] = FULL_EVAL):
+    """Return (cache keys, evals-or-None per candidate); keys are None without a cache."""
+    if cache is None:
+        return [None] * len(candidates), [None] * len(candidates)
+    version = prompt_version(*templates)
+    keys = []
+    for doc, _ in candidates:
+        text = _program_text(doc)
+        keys.append(score_key(user_project, _program_key(doc, text), text, OPENAI_MODEL, seed, version))
+    return keys, [cache.get(k) for k in keys]
+
+def _store_evals(evals, keys, todo, resps, cache) -> List[Dict[str, Any]]:
+    for i, resp in zip(todo, resps):
+        evals[i] = _normalize_eval(_parse_first_json(resp.content))
+        if cache is not None:
+            cache.put(keys[i], evals[i])
+    return evals
+
+def _llm_evals(user_project: Dict[str, Any], candidates: List[Tuple[Any, float]],
+               seed: int, concurrency: int, use_cache: bool,
+               templates: Tuple[str, str] = FULL_EVAL,
+               stats: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Normalized per-candidate LLM evals, in candidate order (cache first, LLM for misses)."""
+    cache = get_score_cache() if use_cache else None
+    keys, evals = _cache_lookup(cache, user_project, candidates, seed, templates)
+    todo = [i for i, evd in enumerate(evals) if evd is None]
+    if stats is not None:
+        stats["cache_hits"] = stats.get("cache_hits", 0) + len(candidates) - len(todo)
+
+    resps = []
+    if todo:
+        llm = _scoring_llm(seed)
+        prompt = _scoring_prompt(templates)
+        msgs = [_format_messages(prompt, user_project, candidates[i][0]) for i in todo]
+        if concurrency > 1 and len(msgs) > 1:
+            resps = llm.batch(msgs, config={"max_concurrency": concurrency})
+        else:
+            resps = [llm.invoke(m) for m in msgs]
+    return _store_evals(evals, keys, todo, resps, cache)
+
+async def _allm_evals(user_project: Dict[str, Any], candidates: List[Tuple[Any, float]],
+                      seed: int, concurrency: int, use_cache: bool) -> List[Dict[str, Any]]:
+    cache = get_score_cache() if use_cache else None
+    keys, evals = _cache_lookup(cache, user_project, candidates, seed)
+    todo = [i for i, evd in enumerate(evals) if evd is None]
+
+    resps = []
+    if todo:
+        llm = _scoring_llm(seed)
+        prompt = _scoring_prompt()
+        msgs = [_format_messages(prompt, user_project, candidates[i][0]) for i in todo]
+        resps = await llm.abatch(msgs, config={"max_concurrency": max(1, concurrency)})
+    return _store_evals(evals, keys, todo, resps, cache)
+
 def rank_with_llm_granular(user_project: Dict[str, Any],
                            candidates: List[Tuple[Any, float]],
                            weights: Tuple[float, float, float] = (0.45, 0.35, 0.20),
-                           seed: int = SEED_DEFAULT) -> List[Dict[str, Any]]:
+                           seed: int = SEED_DEFAULT,
+                           concurrency: int = LLM_CONCURRENCY,
+                           use_cache: bool = True) -> List[Dict[str, Any]]:
     """
     For each candidate (doc, distance):
       - Ask LLM for sector/stage/funding/goal alignment
       - Compute rule/content/final scores with provided weights
       - Return sorted list by final_raw desc with reasons/improvements
+
+    With concurrency > 1 the per-candidate prompts are sent in parallel
+    (at most `concurrency` in flight); results are collected in candidate
+    order, so the ranking is identical to the sequential path.
+    Evaluations are served from / written to the persistent score cache
+    unless `use_cache` is False or the cache is disabled in config.
     """
     random.seed(seed)
-    llm = ChatOpenAI(model=OPENAI_MODEL, temperature=0, top_p=1, seed=seed)
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", SYSTEM_PROMPT),
-        ("user",   USER_PROMPT_TEMPLATE)
-    ])
+    evals = _llm_evals(user_project, candidates, seed, concurrency, use_cache)
+    return _rank([_score_candidate(doc, distance, evd, weights)
+                  for (doc, distance), evd in zip(candidates, evals)])
+
+async def arank_with_llm_granular(user_project: Dict[str, Any],
+                                  candidates: List[Tuple[Any, float]],
+                                  weights: Tuple[float, float, float] = (0.45, 0.35, 0.20),
+                                  seed: int = SEED_DEFAULT,
+                                  concurrency: int = LLM_CONCURRENCY,
+                                  use_cache: bool = True) -> List[Dict[str, Any]]:
+    """Async twin of `rank_with_llm_granular` for callers already on an event loop."""
+    random.seed(seed)
+    evals = await _allm_evals(user_project, candidates, seed, concurrency, use_cache)
+    return _rank([_score_candidate(doc, distance, evd, weights)
+                  for (doc, distance), evd in zip(candidates, evals)])
+
+
+def iter_rank_with_llm_granular(user_project: Dict[str, Any],
+                                candidates: List[Tuple[Any, float]],
+                                weights: Tuple[float, float, float] = (0.45, 0.35, 0.20),
+                                seed: int = SEED_DEFAULT,
+                                concurrency: int = LLM_CONCURRENCY,
+                                use_cache: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Generator variant of `rank_with_llm_granular`: yields each candidate's result
+    dict (without "rank") as soon as it is scored — cache hits first, then LLM
+    answers in completion order. Pass everything yielded to `_rank` / sort by
+    final_raw to get the same ranking as the batch API.
+    """
+    random.seed(seed)
+    cache = get_score_cache() if use_cache else None
+    keys, evals = _cache_lookup(cache, user_project, candidates, seed)
+    todo = []
+    for i, evd in enumerate(evals):
+        if evd is None:
+            todo.append(i)
+        else:
+            doc, distance = candidates[i]
+            yield {**_score_candidate(doc, distance, evd, weights), "index": i}
+    if not todo:
+        return
+
+    llm = _scoring_llm(seed)
+    prompt = _scoring_prompt()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as ex:
+        futs = {ex.submit(llm.invoke, _format_messages(prompt, user_project, candidates[i][0])): i
+                for i in todo}
+        for fut in as_completed(futs):
+            i = futs[fut]
+            evd = _store_evals(evals, keys, [i], [fut.result()], cache)[i]
+            doc, distance = candidates[i]
+            yield {**_score_candidate(doc, distance, evd, weights), "index": i}
+
+def rank_results(streamed: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Final ranking for results collected from `iter_rank_with_llm_granular`."""
+    ordered = sorted(streamed, key=lambda r: r.pop("index", 0))
+    return _rank(ordered)
+
+
+# =========================
+# Rule-based modes (offline / hybrid)
+# =========================
+
+def _rule_eval(user_project: Dict[str, Any], doc: Any) -> Dict[str, Any]:
+    """Eval dict with the same keys as the LLM output, computed locally."""
+    prog = program_record(doc)
+    subs = rule_subscores(user_project, prog)
+    reasons, improvements = rule_reasons(user_project, prog, subs)
+    return {
+        "sector_match": subs["sector"],
+        "stage_match": subs["stage"],
+        "funding_match": subs["funding"],
+        "goal_alignment": goal_overlap(user_project, prog),
+        "reasons": reasons,
+        "improvements": improvements,
+    }
+
+def rank_offline(user_project: Dict[str, Any],
+                 candidates: List[Tuple[Any, float]],
+                 weights: Tuple[float, float, float] = (0.45, 0.35, 0.20)) -> List[Dict[str, Any]]:
+    """No LLM at all: rule subscores, lexical goal overlap, templated reasons."""
+    return _rank([_score_candidate(doc, distance, _rule_eval(user_project, doc), weights)
+                  for doc, distance in candidates])
+
+def rank_hybrid(user_project: Dict[str, Any],
+                candidates: List[Tuple[Any, float]],
+                weights: Tuple[float, float, float] = (0.45, 0.35, 0.20),
+                seed: int = SEED_DEFAULT,
+                concurrency: int = LLM_CONCURRENCY,
+                use_cache: bool = True,
+                stats: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Rule engine owns sector/stage/funding; the LLM only contributes
+    goal_alignment and reasons/improvements. Falls back to `rank_offline`
+    when the LLM cannot be reached, recording fallback="offline" in `stats`.
+    """
+    random.seed(seed)
+    try:
+        evals = _llm_evals(user_project, candidates, seed, concurrency, use_cache, HYBRID_EVAL)
+    except Exception as e:
+        log.warning("hybrid scoring: LLM unavailable, using offline rules (%s)", e)
+        if stats is not None:
+            stats["fallback"] = "offline"
+        return rank_offline(user_project, candidates, weights)
+
+    return _rank([_score_candidate(doc, distance, _with_rule_subscores(user_project, doc, evd), weights)
+                  for (doc, distance), evd in zip(candidates, evals)])
+
+def _with_rule_subscores(user_project: Dict[str, Any], doc: Any, evd: Dict[str, Any]) -> Dict[str, Any]:
+    rule = _rule_eval(user_project, doc)
+    return {**evd, **{k: rule[k] for k in ("sector_match", "stage_match", "funding_match")}}
+
+def _rule_component(user_project: Dict[str, Any], doc: Any) -> float:
+    rule = _rule_eval(user_project, doc)
+    return (0.4 * _round_tenth(rule["sector_match"]) + 0.4 * _round_tenth(rule["stage_match"])
+            + 0.2 * _round_tenth(rule["funding_match"]))
 
-    out: List[Dict[str, Any]] = []
+
+# =========================
+# Cheap prefilter (cascade stage 1)
+# =========================
+
+def cheap_score(user_project: Dict[str, Any], doc: Any, distance: float,
+                weights: Tuple[float, float, float] = (0.45, 0.35, 0.20)) -> float:
+    """final_raw estimate from rules + content only; no LLM involved."""
+    goal = goal_overlap(user_project, program_record(doc))
+    return (weights[0]*_rule_component(user_project, doc) + weights[1]*_content_from_distance(distance)
+            + weights[2]*goal)
+
+def prefilter_candidates(user_project: Dict[str, Any],
+                         candidates: List[Tuple[Any, float]],
+                         keep: int,
+                         weights: Tuple[float, float, float] = (0.45, 0.35, 0.20)):
+    """
+    Keep the `keep` candidates with the best cheap score (retrieval order preserved
+    among the kept ones). Returns (kept, cheap_scores) where cheap_scores is
+    aligned with the input list.
+    """
+    scores = [cheap_score(user_project, doc, distance, weights) for doc, distance in candidates]
+    if keep <= 0 or keep >= len(candidates):
+        return list(candidates), scores
+    order = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)
+    chosen = set(order[:keep])
+    return [c for i, c in enumerate(candidates) if i in chosen], scores
+
+
+# =========================
+# Anytime top-k (bound-based early termination)
+# =========================
+
+def rank_with_llm_anytime(user_project: Dict[str, Any],
+                          candidates: List[Tuple[Any, float]],
+                          top_k: int,
+                          weights: Tuple[float, float, float] = (0.45, 0.35, 0.20),
+                          seed: int = SEED_DEFAULT,
+                          hybrid: bool = False,
+                          wave_size: int = 1,
+                          concurrency: int = LLM_CONCURRENCY,
+                          use_cache: bool = True,
+                          stats: Optional[Dict[str, Any]] = None,
+                          templates: Optional[Tuple[str, str]] = None) -> List[Dict[str, Any]]:
+    """
+    Top-k ranking that stops calling the LLM once no remaining candidate can
+    beat the current k-th best final_raw.
+
+    content is known from the distance before any LLM call, so each candidate
+    is bounded by  w_rule*rule_ub + w_content*content + w_goal*1,  where rule_ub
+    is 1 (or the exact rule-engine value when `hybrid`). Candidates are
+    evaluated in descending bound order: the first `top_k` in one parallel
+    batch, then `wave_size` at a time.
+
+    Returns only the evaluated candidates, ranked; skipped ones could not have
+    made the top-k. If `stats` is given it is filled with evaluated / cache_hits /
+    llm_calls_saved counts; skipped candidates that were cached do not count as saved calls.
+    `templates` defaults to the hybrid prompt when `hybrid`, the full one otherwise.
+    """
+    random.seed(seed)
+    templates = templates or (HYBRID_EVAL if hybrid else FULL_EVAL)
+    bounds = []
     for doc, distance in candidates:
-        msg = prompt.format_messages(
-            project_name=user_project.get("name", ""),
-            project_description=user_project.get("description", ""),
-            project_sectors=user_project.get("sectors", []),
-            project_stage=user_project.get("stage", ""),
-            project_funding_need=user_project.get("funding_need", ""),
-            project_goals=user_project.get("goals", []),
-            program_text=_program_text(doc),
-        )
-        resp = llm.invoke(msg)
-        raw = _parse_first_json(resp.content)
-
-        # --- normalize LLM output ---
-        evd = _normalize_eval(raw)
-
-        sector  = _round_tenth(evd["sector_match"])
-        stage   = _round_tenth(evd["stage_match"])
-        funding = _round_tenth(evd["funding_match"])
-        goal    = _safe_01(evd["goal_alignment"])
-
-        rule    = 0.4 * sector + 0.4 * stage + 0.2 * funding
-        content = _content_from_distance(distance)     # cosine distance -> similarity
-        final_raw = weights[0]*rule + weights[1]*content + weights[2]*goal
-
-        out.append({
-            "doc": doc,
-            "raw_distance": float(distance),
-            "scores": {
-                "rule": rule,
-                "content": content,
-                "goal": goal,
-                "final_raw": final_raw
-            },
-            "subscores": {
-                "sector": sector,
-                "stage":  stage,
-                "funding": funding
-            },
-            "reasons": evd["reasons"],           # normalized List[str]
-            "improvements": evd["improvements"], # normalized List[str]
-        })
+        rule_ub = _rule_component(user_project, doc) if hybrid else 1.0
+        bounds.append(weights[0]*rule_ub + weights[1]*_content_from_distance(distance) + weights[2])
+    order = sorted(range(len(candidates)), key=lambda i: bounds[i], reverse=True)
 
-    out.sort(key=lambda r: r["scores"]["final_raw"], reverse=True)
-    for i, r in enumerate(out, start=1):
-        r["rank"] = i
-    return out
+    scored: Dict[int, Dict[str, Any]] = {}
+    hits: Dict[str, Any] = {}
+    pos = 0
+    while pos < len(order):
+        if len(scored) >= top_k:
+            kth = sorted((r["scores"]["final_raw"] for r in scored.values()), reverse=True)[top_k - 1]
+            # a bound equal to the k-th score could still tie it and win on retrieval order
+            if bounds[order[pos]] < kth:
+                break
+        step = max(1, top_k - len(scored)) if len(scored) < top_k else max(1, wave_size)
+        wave = order[pos:pos + step]
+        pos += len(wave)
+        subset = [candidates[i] for i in wave]
+        evals = _llm_evals(user_project, subset, seed, concurrency, use_cache, templates, hits)
+        for i, (doc, distance), evd in zip(wave, subset, evals):
+            if hybrid:
+                evd = _with_rule_subscores(user_project, doc, evd)
+            scored[i] = _score_candidate(doc, distance, evd, weights)
+
+    if stats is not None:
+        cache = get_score_cache() if use_cache else None
+        _, skipped = _cache_lookup(cache, user_project, [candidates[i] for i in order[pos:]], seed, templates)
+        stats.update({"candidates": len(candidates), "evaluated": len(scored),
+                      "cache_hits": hits.get("cache_hits", 0),
+                      "llm_calls_saved": sum(evd is None for evd in skipped)})
+    # back to retrieval order before the stable sort, like the other modes
+    return _rank([scored[i] for i in sorted(scored)])
+
+
+# =========================
+# Two-phase mode: numeric scores for all, explanations for the top-k
+# =========================
+
+def _parse_explanation(txt: str) -> Dict[str, List[str]]:
+    raw = _parse_first_json(txt)
+    return {"reasons": _to_list_of_str(raw.get("reasons")),
+            "improvements": _to_list_of_str(raw.get("improvements"))}
+
+def explain_results(user_project: Dict[str, Any],
+                    results: List[Dict[str, Any]],
+                    seed: int = SEED_DEFAULT,
+                    concurrency: int = LLM_CONCURRENCY,
+                    use_cache: bool = True) -> List[Dict[str, Any]]:
+    """Fill reasons/improvements in place for `results` (one concurrent LLM call each)."""
+    if not results:
+        return results
+    cache = get_score_cache() if use_cache else None
+    cands = [(r["doc"], r["raw_distance"]) for r in results]
+    keys, texts = _cache_lookup(cache, user_project, cands, seed, EXPLAIN)
+    todo = [i for i, t in enumerate(texts) if t is None]
+    if todo:
+        llm = _scoring_llm(seed)
+        prompt = _scoring_prompt(EXPLAIN)
+        msgs = []
+        for i in todo:
+            r = results[i]
+            scores = {**r["subscores"], "goal": round(r["scores"]["goal"], 2)}
+            msgs.append(_format_messages(prompt, user_project, r["doc"],
+                                         scores=json.dumps(scores, ensure_ascii=False)))
+        resps = llm.batch(msgs, config={"max_concurrency": max(1, concurrency)})
+        for i, resp in zip(todo, resps):
+            texts[i] = _parse_explanation(resp.content)
+            if cache is not None:
+                cache.put(keys[i], texts[i])
+    for r, t in zip(results, texts):
+        r["reasons"], r["improvements"] = t["reasons"], t["improvements"]
+    return results
+
+def rank_two_phase(user_project: Dict[str, Any],
+                   candidates: List[Tuple[Any, float]],
+                   top_k: int,
+                   weights: Tuple[float, float, float] = (0.45, 0.35, 0.20),
+                   seed: int = SEED_DEFAULT,
+                   concurrency: int = LLM_CONCURRENCY,
+                   use_cache: bool = True,
+                   early_stop: bool = False,
+                   wave_size: int = 1,
+                   stats: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Phase 1 scores every candidate with the compact numeric-only schema (no
+    reasons text, so far fewer output tokens); phase 2 generates reasons /
+    improvements only for the `top_k` results that will be persisted.
+    Results outside the top-k keep empty reasons/improvements.
+    """
+    if early_stop:
+        ranked = rank_with_llm_anytime(user_project, candidates, top_k, weights=weights, seed=seed,
+                                       wave_size=wave_size, concurrency=concurrency,
+                                       use_cache=use_cache, stats=stats, templates=SCORE_ONLY)
+    else:
+        random.seed(seed)
+        evals = _llm_evals(user_project, candidates, seed, concurrency, use_cache, SCORE_ONLY)
+        ranked = _rank([_score_candidate(doc, distance, evd, weights)
+                        for (doc, distance), evd in zip(candidates, evals)])
+    for r in ranked[top_k:]:
+        r["reasons"], r["improvements"] = [], []
+    explain_results(user_project, ranked[:top_k], seed=seed, concurrency=concurrency, use_cache=use_cache)
+    return ranked
+
+
+# =========================
+# Batched scoring (N programs per LLM call)
+# =========================
+
+_EVAL_SCORE_KEYS = ("sector_match", "stage_match", "funding_match", "goal_alignment")
+
+def _program_key(doc: Any, text: Optional[str] = None) -> str:
+    """Catalog program id, else a hash of the program text; never depends on the candidate's position."""
+    pid = program_id(doc) or (getattr(doc, "metadata", None) or {}).get("slug")
+    if pid:
+        return str(pid)
+    raw = text if text is not None else _program_text(doc)
+    return "sha-" + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:12]
+
+def _candidate_keys(candidates: List[Tuple[Any, float]]) -> List[str]:
+    """Stable, unique program ids used to match batched answers back to candidates."""
+    keys: List[str] = []
+    seen = set()
+    for i, (doc, _) in enumerate(candidates, start=1):
+        k = _program_key(doc)
+        if k in seen:           # the same program retrieved twice
+            k = f"{k}#{i}"
+        seen.add(k)
+        keys.append(k)
+    return keys
+
+def _batch_messages(prompt: ChatPromptTemplate, user_project: Dict[str, Any],
+                    chunk: List[Tuple[str, Any]]):
+    block = "\n\n".join(f"### program_id: {key}\n{_program_text(doc)}" for key, doc in chunk)
+    return prompt.format_messages(
+        project_name=user_project.get("name", ""),
+        project_description=user_project.get("description", ""),
+        project_sectors=user_project.get("sectors", []),
+        project_stage=user_project.get("stage", ""),
+        project_funding_need=user_project.get("funding_need", ""),
+        project_goals=user_project.get("goals", []),
+        programs_block=block,
+    )
+
+def _camel(k: str) -> str:
+    head, *rest = k.split("_")
+    return head + "".join(p.title() for p in rest)
+
+def _valid_batch_items(resp_content: str, expected: set) -> Dict[str, Dict[str, Any]]:
+    """Keep only well-formed items whose program_id was asked for (first answer wins)."""
+    try:
+        items = _parse_json_array(resp_content)
+    except Exception:
+        return {}
+    got: Dict[str, Dict[str, Any]] = {}
+    for it in items:
+        if not isinstance(it, dict):
+            continue
+        key = str(it.get("program_id") or it.get("id") or "").strip()
+        if key not in expected or key in got:
+            continue
+        if not all(k in it or _camel(k) in it for k in _EVAL_SCORE_KEYS):
+            continue
+        got[key] = _normalize_eval(it)
+    return got
+
+def rank_with_llm_batched(user_project: Dict[str, Any],
+                          candidates: List[Tuple[Any, float]],
+                          weights: Tuple[float, float, float] = (0.45, 0.35, 0.20),
+                          seed: int = SEED_DEFAULT,
+                          batch_size: int = SCORING_BATCH_SIZE,
+                          concurrency: int = LLM_CONCURRENCY,
+                          use_cache: bool = True) -> List[Dict[str, Any]]:
+    """
+    Same output as `rank_with_llm_granular`, but scores `batch_size` programs
+    per LLM call so the system prompt and PROJECT block are sent once per batch.
+    Programs with a cached batch evaluation are left out of the batches; ids that
+    come back missing or malformed are re-scored one by one (per-candidate cache).
+    """
+    random.seed(seed)
+    cache = get_score_cache() if use_cache else None
+    cache_keys, cached = _cache_lookup(cache, user_project, candidates, seed, BATCH_EVAL)
+
+    keys = _candidate_keys(candidates)
+    evals: Dict[str, Dict[str, Any]] = {k: evd for k, evd in zip(keys, cached) if evd is not None}
+    keyed = [(k, doc) for k, (doc, _) in zip(keys, candidates) if k not in evals]
+    size = max(1, batch_size)
+    chunks = [keyed[i:i + size] for i in range(0, len(keyed), size)]
+
+    if chunks:
+        llm = _scoring_llm(seed)
+        batch_prompt = _scoring_prompt(BATCH_EVAL)
+        msgs = [_batch_messages(batch_prompt, user_project, ch) for ch in chunks]
+        resps = llm.batch(msgs, config={"max_concurrency": max(1, concurrency)})
+        for ch, resp in zip(chunks, resps):
+            got = _valid_batch_items(resp.content, {k for k, _ in ch})
+            evals.update(got)
+            if cache is not None:
+                for k in got:
+                    cache.put(cache_keys[keys.index(k)], got[k])
+
+    missing = [i for i, k in enumerate(keys) if k not in evals]
+    if missing:
+        single = _llm_evals(user_project, [candidates[i] for i in missing], seed, concurrency, use_cache)
+        for i, evd in zip(missing, single):
+            evals[keys[i]] = evd
+
+    out = [_score_candidate(doc, distance, evals[k], weights)
+           for k, (doc, distance) in zip(keys, candidates)]
+    return _rank(out)
 
 
 # =========================
@@ -1,15 +1,25 @@
 # matcher/service.py
 from __future__ import annotations
+import logging
+import math
 import re
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional, List
+from typing import Any, Callable, Dict, Iterator, Optional, List, Tuple
 
 from .vectorstore import get_vectordb           # uses your env config
 from .retrieval import retrieve_candidates
-from .scoring import rank_with_llm_granular, apply_calibration
-from .config import OPENAI_MODEL, EMBED_MODEL, COLLECTION
+from .catalog import program_record
+from .scoring import (rank_with_llm_granular, rank_with_llm_batched,
+                      rank_offline, rank_hybrid, rank_with_llm_anytime, rank_two_phase,
+                      iter_rank_with_llm_granular, rank_results,
+                      apply_calibration, prefilter_candidates)
+from .config import (OPENAI_MODEL, EMBED_MODEL, COLLECTION, SCORING_MODE, SCORING_BATCH_SIZE,
+                     CASCADE_ENABLED, CASCADE_KEEP, CASCADE_FACTOR, EARLY_STOP, ANYTIME_WAVE,
+                     RETRIEVAL_MODE, RETRIEVAL_K)
 from .db import insert_match_results_only as insert_rows
 
+log = logging.getLogger(__name__)
+
 def _clean_url(u: Optional[str]) -> Optional[str]:
     if not u: return None
     u = u.strip()
@@ -26,10 +36,13 @@ def _program_identity(md: dict, doc_source: Optional[str] = None):
     purl = _clean_url(md.get("url") or md.get("source_url") or doc_source)
     return pid or pname, pname, purl
 
+def _doc_identity(doc: Any) -> Tuple[Any, str, Optional[str]]:
+    md = program_record(doc)
+    return _program_identity(md, md.get("source_path") or md.get("source"))
+
 def _pack_result(r: Dict[str, Any], project_row: Dict[str, Any]) -> Dict[str, Any]:
-    md = (r["doc"].metadata or {})
-    src = md.get("source_path") or md.get("source")
-    program_id, program_name, source_url = _program_identity(md, src)
+    md = program_record(r["doc"])     # catalog record: list fields (goals) survive, unlike vector metadata
+    program_id, program_name, source_url = _program_identity(md, md.get("source_path") or md.get("source"))
     s = r["scores"]; subs = r.get("subscores", {}) or {}
     return {
         "rank": r["rank"],
@@ -57,15 +70,59 @@ def _pack_result(r: Dict[str, Any], project_row: Dict[str, Any]) -> Dict[str, An
         },
     }
 
-def run_match_and_insert(project_row: Dict[str, Any],
-                         top_k: int = 5,
-                         calibration: Optional[str] = "relative_minmax") -> Dict[str, Any]:
-    """
-    project_row fields needed: id, slug, name, description, sectors, stage, funding_need, goals
-    Returns { payload, inserted, run_at }
-    """
-    vdb = get_vectordb()
-    user_project = {
+def _rank_candidates(user_project: Dict[str, Any], cands, mode: str, top_k: int,
+                     stats: Dict[str, Any]) -> List[Dict[str, Any]]:
+    weights = (0.45, 0.35, 0.20)
+    if mode == "two_phase":
+        return rank_two_phase(user_project, cands, top_k, weights=weights,
+                              early_stop=EARLY_STOP, wave_size=ANYTIME_WAVE, stats=stats)
+    if EARLY_STOP and mode in ("llm", "hybrid"):
+        try:
+            return rank_with_llm_anytime(user_project, cands, top_k, weights=weights,
+                                         hybrid=(mode == "hybrid"), wave_size=ANYTIME_WAVE, stats=stats)
+        except Exception as e:
+            if mode == "llm":
+                raise
+            log.warning("hybrid scoring: LLM unavailable, using offline rules (%s)", e)
+            stats["fallback"] = "offline"
+            return rank_offline(user_project, cands, weights=weights)
+    if mode == "batch":
+        return rank_with_llm_batched(user_project, cands, weights=weights, batch_size=SCORING_BATCH_SIZE)
+    if mode == "offline":
+        return rank_offline(user_project, cands, weights=weights)
+    if mode == "hybrid":
+        return rank_hybrid(user_project, cands, weights=weights, stats=stats)
+    if mode != "llm":
+        raise ValueError(f"Unknown scoring mode: {mode!r}")
+    return rank_with_llm_granular(user_project, cands, weights=weights)
+
+def _dropped_at(kept: bool, rank: Optional[int], top_k: int) -> Optional[str]:
+    if not kept:
+        return "prefilter"
+    if rank is None:
+        return "early_stop"     # passed the prefilter, skipped by the anytime bound
+    return "rank" if rank > top_k else None
+
+def _cascade_meta(cands, cheap, kept, ranked, top_k: int, keep: int) -> Dict[str, Any]:
+    """Per-candidate trace of where the cascade stopped it: prefilter, early stop, rank, or persisted."""
+    kept_ids = {id(doc) for doc, _ in kept}
+    scored = {id(r["doc"]): r["rank"] for r in ranked}
+    trace = []
+    for (doc, distance), cs in zip(cands, cheap):
+        pid, _, _ = _doc_identity(doc)
+        rank = scored.get(id(doc))
+        trace.append({
+            "program_id": pid,
+            "raw_distance": float(distance),
+            "cheap_score": cs,
+            "rank": rank,
+            "dropped_at": _dropped_at(id(doc) in kept_ids, rank, top_k),
+        })
+    return {"retrieved": len(cands), "keep": keep, "kept": len(kept), "scored": len(ranked),
+            "candidates": trace}
+
+def _user_project(project_row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
         "name": project_row["name"],
         "description": project_row["description"],
         "sectors": project_row["sectors"],
@@ -74,14 +131,14 @@ def run_match_and_insert(project_row: Dict[str, Any],
         "goals": project_row["goals"],
     }
 
-    cands  = retrieve_candidates(vdb, user_project, k=max(top_k, 10))
-    ranked = rank_with_llm_granular(user_project, cands, weights=(0.45, 0.35, 0.20))
-    apply_calibration(ranked, calibration)
-
-    run_at_iso = datetime.now(timezone.utc).isoformat().replace("+00:00","Z")
-    results = [_pack_result(r, project_row) for r in ranked[:top_k]]
+def _cascade_keep(top_k: int) -> int:
+    return (CASCADE_KEEP or math.ceil(CASCADE_FACTOR * top_k)) if CASCADE_ENABLED else 0
 
-    payload = {
+def _build_payload(project_row: Dict[str, Any], results: List[Dict[str, Any]], run_at_iso: str,
+                   top_k: int, calibration: Optional[str], mode: str,
+                   rank_stats: Dict[str, Any], cascade: Dict[str, Any]) -> Dict[str, Any]:
+    early_stop = {k: v for k, v in rank_stats.items() if k != "fallback"}
+    return {
         "project_ref": {"id": project_row["id"], "slug": project_row.get("slug")},
         "project": {
             "name": project_row.get("name"),
@@ -94,13 +151,17 @@ def run_match_and_insert(project_row: Dict[str, Any],
         "meta": {
             "run_at": run_at_iso,
             "weights": {"rule": 0.45, "content": 0.35, "goal": 0.20},
-            "retrieval": {"collection": COLLECTION, "metric": "cosine", "k": top_k},
+            "retrieval": {"collection": COLLECTION, "metric": "cosine", "k": top_k, "mode": RETRIEVAL_MODE},
             "calibration": {"strategy": calibration, "range": [0.70, 0.95]} if calibration else None,
             "models": {"llm": OPENAI_MODEL, "embedding": EMBED_MODEL},
+            "scoring": {"mode": mode, "early_stop": early_stop or None,
+                        "fallback": rank_stats.get("fallback")},
+            "cascade": cascade,
         },
         "results": results,
     }
 
+def _persist(project_row: Dict[str, Any], results: List[Dict[str, Any]], run_at_iso: str) -> Dict[str, Any]:
     # Insert only results using your robust DB helper
     # That helper expects a smaller shape: {project_id, project_slug, run_at, results}
     out_for_db = {
@@ -109,5 +170,84 @@ def run_match_and_insert(project_row: Dict[str, Any],
         "run_at": run_at_iso,
         "results": results,
     }
-    wrote = insert_rows(out_for_db)   # returns {"inserted": N, "data": [...] }
+    return insert_rows(out_for_db)   # returns {"inserted": N, "data": [...] }
+
+def run_match_and_insert(project_row: Dict[str, Any],
+                         top_k: int = 5,
+                         calibration: Optional[str] = "relative_minmax",
+                         scoring_mode: Optional[str] = None,
+                         on_progress: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    project_row fields needed: id, slug, name, description, sectors, stage, funding_need, goals
+    scoring_mode: "llm" | "batch" | "two_phase" | "hybrid" | "offline"
+                  (defaults to SCORING_MODE from config)
+    on_progress: optional callback(stage, info) with stage in retrieval | scoring | persisted
+    Returns { payload, inserted, run_at }
+    """
+    mode = scoring_mode or SCORING_MODE
+    progress = on_progress or (lambda stage, info: None)
+    vdb = get_vectordb()
+    user_project = _user_project(project_row)
+
+    cands  = retrieve_candidates(vdb, user_project, k=max(top_k, RETRIEVAL_K))
+    keep   = _cascade_keep(top_k)
+    kept, cheap = prefilter_candidates(user_project, cands, keep)
+    progress("retrieval", {"retrieved": len(cands), "kept": len(kept)})
+    rank_stats: Dict[str, Any] = {}
+    ranked = _rank_candidates(user_project, kept, mode, top_k, rank_stats)
+    apply_calibration(ranked, calibration)
+    progress("scoring", {"scored": len(ranked)})
+
+    run_at_iso = datetime.now(timezone.utc).isoformat().replace("+00:00","Z")
+    results = [_pack_result(r, project_row) for r in ranked[:top_k]]
+    payload = _build_payload(project_row, results, run_at_iso, top_k, calibration, mode,
+                             rank_stats, _cascade_meta(cands, cheap, kept, ranked, top_k, keep))
+
+    wrote = _persist(project_row, results, run_at_iso)
+    progress("persisted", {"inserted": wrote.get("inserted", 0)})
     return {"payload": payload, "inserted": wrote.get("inserted", 0), "run_at": run_at_iso}
+
+def iter_match_and_insert(project_row: Dict[str, Any],
+                          top_k: int = 5,
+                          calibration: Optional[str] = "relative_minmax") -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming variant of `run_match_and_insert`. Always scores per candidate with the
+    LLM ("llm" mode, no early stop), ignoring SCORING_MODE / EARLY_STOP, so results can
+    differ from `run_match_and_insert` in other modes; `meta.scoring` says so.
+    Yields (event, data) pairs:
+      retrieval -> {candidates: [{program_id, program_name, raw_distance, content, prefiltered}], meta}
+      candidate -> {program_id, program_name, scores, subscores, done, total}   (once per scored candidate)
+      ranking   -> {run_at, results, meta}   (calibrated top_k, same shape as payload["results"])
+      persisted -> {inserted, ids}
+    """
+    meta = {"scoring": {"mode": "llm", "early_stop": None, "streamed": True}}
+    user_project = _user_project(project_row)
+    cands = retrieve_candidates(get_vectordb(), user_project, k=max(top_k, RETRIEVAL_K))
+    kept, _ = prefilter_candidates(user_project, cands, _cascade_keep(top_k))
+    kept_ids = {id(doc) for doc, _ in kept}
+
+    listing = []
+    for doc, distance in cands:
+        pid, pname, _ = _doc_identity(doc)
+        listing.append({"program_id": pid, "program_name": pname, "raw_distance": float(distance),
+                        "content": max(0.0, min(1.0, 1.0 - float(distance))),
+                        "prefiltered": id(doc) not in kept_ids})
+    yield "retrieval", {"candidates": listing, "meta": meta}
+
+    streamed: List[Dict[str, Any]] = []
+    for r in iter_rank_with_llm_granular(user_project, kept, weights=(0.45, 0.35, 0.20)):
+        streamed.append(r)
+        pid, pname, _ = _doc_identity(r["doc"])
+        yield "candidate", {"program_id": pid, "program_name": pname,
+                            "scores": r["scores"], "subscores": r["subscores"],
+                            "done": len(streamed), "total": len(kept)}
+
+    ranked = rank_results(streamed)
+    apply_calibration(ranked, calibration)
+    run_at_iso = datetime.now(timezone.utc).isoformat().replace("+00:00","Z")
+    results = [_pack_result(r, project_row) for r in ranked[:top_k]]
+    yield "ranking", {"run_at": run_at_iso, "results": results, "meta": meta}
+
+    wrote = _persist(project_row, results, run_at_iso)
+    ids = [row.get("id") for row in (wrote.get("data") or []) if isinstance(row, dict)]
+    yield "persisted", {"inserted": wrote.get("inserted", 0), "ids": ids}
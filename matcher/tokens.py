@@ -0,0 +1,31 @@
+# matcher/tokens.py
+"""
+Token counting for prompt budgets and rate limiting.
+
+Uses tiktoken's encoding for the model; when the encoding file cannot be
+loaded (tiktoken fetches it on first use, so offline machines fail) it falls
+back to a character estimate that errs on the high side for Arabic text.
+"""
+from __future__ import annotations
+from functools import lru_cache
+from typing import Any, Optional
+
+CHARS_PER_TOKEN_FALLBACK = 2.5
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str) -> Optional[Any]:
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    enc = _encoding(model)
+    if enc is None:
+        return int(len(text or "") / CHARS_PER_TOKEN_FALLBACK) + 1
+    return len(enc.encode(text or "", disallowed_special=()))
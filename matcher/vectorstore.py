@@ -1,14 +1,66 @@
-from typing import Any
+import threading
+from typing import Any, Optional
 from langchain_openai import OpenAIEmbeddings
 from langchain_chroma import Chroma
-from .config import PERSIST_DIR, COLLECTION, EMBED_MODEL
+from .config import PERSIST_DIR, COLLECTION, EMBED_MODEL, VECTOR_BACKEND, NPINDEX_DIR
+from .embed_cache import cached_embeddings
+
+# One embeddings client + one Chroma collection per process. Both are safe to
+# share across threads for reads; the lock only guards open/reload/close.
+_lock = threading.RLock()
+_embeddings: Optional[Any] = None
+_vectordb: Optional[Any] = None
 
 def get_embeddings():
-    return OpenAIEmbeddings(model=EMBED_MODEL)
+    global _embeddings
+    with _lock:
+        if _embeddings is None:
+            _embeddings = cached_embeddings(OpenAIEmbeddings(model=EMBED_MODEL), EMBED_MODEL)
+        return _embeddings
 
-def get_vectordb() -> Any:
+def _open() -> Any:
+    if VECTOR_BACKEND == "numpy":
+        from .npindex import NumpyIndex
+        return NumpyIndex.load(NPINDEX_DIR, embedding_function=get_embeddings())
     return Chroma(
         collection_name=COLLECTION,
         persist_directory=PERSIST_DIR,
         embedding_function=get_embeddings(),
     )
+
+def open_vectordb() -> Any:
+    """Open the shared collection if it is not open yet (idempotent)."""
+    global _vectordb
+    with _lock:
+        if _vectordb is None:
+            _vectordb = _open()
+        return _vectordb
+
+def get_vectordb() -> Any:
+    return _vectordb if _vectordb is not None else open_vectordb()
+
+def doc_count(vdb: Any) -> int:
+    return vdb.count() if hasattr(vdb, "count") else vdb._collection.count()
+
+def warm_vectordb() -> int:
+    """Open the collection and touch it so the first request doesn't pay for it; returns the doc count."""
+    return doc_count(open_vectordb())
+
+def reload_vectordb() -> Any:
+    """Swap in a freshly opened collection (e.g. after rebuilding the index)."""
+    global _vectordb
+    fresh = _open()
+    with _lock:
+        _vectordb = fresh
+    return fresh
+
+def close_vectordb() -> None:
+    """Drop the shared handle and release Chroma's cached client systems (shutdown only)."""
+    global _vectordb
+    with _lock:
+        _vectordb = None
+        try:
+            from chromadb.api.shared_system_client import SharedSystemClient
+            SharedSystemClient.clear_system_cache()
+        except Exception:
+            pass